@@ -0,0 +1,166 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+# Seconds a request may wait for a slot before it is shed with 503
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "1.0"))
+
+# Retry-After sent with shed requests
+ADMISSION_RETRY_AFTER = os.getenv("ADMISSION_RETRY_AFTER", "1")
+
+# Shedding within this many seconds counts as being under pressure
+ADMISSION_PRESSURE_WINDOW = 5.0
+
+# Concurrent requests and bounded wait queue per route class
+ROUTE_CLASS_LIMITS = {
+    "recommend": (
+        int(os.getenv("ADMISSION_RECOMMEND_CONCURRENCY", "16")),
+        int(os.getenv("ADMISSION_RECOMMEND_QUEUE", "64"))
+    ),
+    "personalized": (
+        int(os.getenv("ADMISSION_PERSONALIZED_CONCURRENCY", "8")),
+        int(os.getenv("ADMISSION_PERSONALIZED_QUEUE", "32"))
+    ),
+    "write": (
+        int(os.getenv("ADMISSION_WRITE_CONCURRENCY", "4")),
+        int(os.getenv("ADMISSION_WRITE_QUEUE", "16"))
+    ),
+}
+
+class Overloaded(Exception):
+    """A request shed by admission control: 429 when the queue is full, 503 when its wait ran out"""
+
+    def __init__(self, route_class: str, status_code: int, reason: str, retry_after: str = ADMISSION_RETRY_AFTER):
+        super().__init__(f"{route_class}: {reason}")
+        self.route_class = route_class
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+class ConcurrencyLimiter:
+    """
+    Concurrency limit with a bounded FIFO wait queue and a queue-time deadline.
+
+    Up to ``limit`` calls run at once. Further calls wait in line, up to
+    ``queue_size`` of them; a call arriving at a full queue is rejected
+    immediately (429) and one that has waited ``queue_timeout`` seconds
+    gives up (503). Rejecting early keeps the threadpool and database free
+    for the requests already admitted, and for cheap routes like /health.
+
+    Must be used from a single event loop.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue_size = max(0, queue_size)
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiters: "deque[asyncio.Future]" = deque()
+
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.degraded = 0
+        self.max_queued = 0
+        self.queue_seconds = 0.0
+        self.last_shed_at = None
+
+    async def run(self, fn: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """Return ``await fn(*args, **kwargs)`` once a slot is free (raises Overloaded when shed)"""
+        await self.acquire()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            self.release()
+
+    def _shed(self, status_code: int, reason: str) -> Overloaded:
+        self.last_shed_at = time.monotonic()
+        return Overloaded(self.name, status_code, reason)
+
+    async def acquire(self):
+        """Take a slot, waiting in line if needed; pair with release()"""
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            self.shed_queue_full += 1
+            raise self._shed(429, "queue full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self.max_queued = max(self.max_queued, len(self._waiters))
+        started = time.monotonic()
+        granted = False
+        try:
+            # Shielded so a timeout leaves the future to be resolved here, not cancelled
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+            granted = True
+        except asyncio.TimeoutError:
+            self.shed_timeout += 1
+            raise self._shed(503, "queue timeout")
+        finally:
+            self.queue_seconds += time.monotonic() - started
+            if granted:
+                self.admitted += 1
+            elif future.done() and not future.cancelled():
+                # A slot was handed over just as this waiter gave up
+                self.release()
+            else:
+                future.cancel()
+                self._waiters.remove(future)
+
+    def release(self):
+        # Hand the slot straight to the next waiter, so newcomers cannot jump the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def under_pressure(self) -> bool:
+        recently_shed = self.last_shed_at is not None and time.monotonic() - self.last_shed_at < ADMISSION_PRESSURE_WINDOW
+        return bool(self._waiters) or recently_shed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "active": self._active,
+            "queued": len(self._waiters),
+            "max_queued": self.max_queued,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_timeout": self.shed_timeout,
+            "degraded": self.degraded,
+            "avg_queue_seconds": self.queue_seconds / self.admitted if self.admitted else 0.0
+        }
+
+class AdmissionControl:
+    """One ConcurrencyLimiter per route class (see ROUTE_CLASS_LIMITS)"""
+
+    def __init__(self, limits: Dict[str, tuple] = ROUTE_CLASS_LIMITS, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.limiters = {
+            name: ConcurrencyLimiter(name, limit, queue_size, queue_timeout)
+            for name, (limit, queue_size) in limits.items()
+        }
+
+    def __getitem__(self, route_class: str) -> ConcurrencyLimiter:
+        return self.limiters[route_class]
+
+    def under_pressure(self) -> bool:
+        """True while any route class is queueing or has shed requests recently"""
+        return any(limiter.under_pressure() for limiter in self.limiters.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
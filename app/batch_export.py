@@ -0,0 +1,281 @@
+"""
+Offline export of top-N recommendations for every product and every active user
+
+Usage:
+    python -m app.batch_export --output exports/nightly [--top-n 20] [--format npz|parquet]
+        [--memory-mb 512] [--workers 1] [--active-days 90] [--model-path model.joblib]
+
+Recommendations are computed for many queries at once, one chunk at a time,
+with the chunk size derived from --memory-mb (per worker). Each chunk is
+written to its own file and recorded in checkpoint.json, so re-running the
+same command after an interruption skips the chunks already written.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .database import SessionLocal
+from .models import Product
+from .pipeline import PIPELINE_SEEDS, Deadline
+from .profiles import PROFILE_INTERACTIONS
+from .recommender import ConstructionProductRecommender
+
+CHECKPOINT_FILE = "checkpoint.json"
+MODEL_FILE = "model.joblib"
+
+# Model shared with forked workers (copy-on-write, never pickled)
+_model: Optional[ConstructionProductRecommender] = None
+_product_ids: Optional[np.ndarray] = None
+
+def top_n_rows(scores: np.ndarray, top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise top-N column indices and scores, best first; -inf entries are never returned"""
+    n_rows, n_columns = scores.shape
+    indices = np.full((n_rows, top_n), -1, dtype=np.int32)
+    values = np.zeros((n_rows, top_n), dtype=np.float32)
+    k = min(top_n, n_columns)
+    if k <= 0:
+        return indices, values
+
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    valid = np.isfinite(top_scores)
+    indices[:, :k] = np.where(valid, top, -1)
+    values[:, :k] = np.where(valid, top_scores, 0)
+    return indices, values
+
+def product_chunk(start: int, stop: int, top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-N similar products for catalog rows [start, stop)"""
+    rows = np.arange(start, stop)
+    scores = _model.similarity_rows(rows)
+    # A product is never recommended for itself
+    scores[np.arange(len(rows)), rows] = -np.inf
+    return top_n_rows(scores, top_n)
+
+def user_chunk(user_seeds: List[List[Dict]], top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-N personalized products per user, from the same pipeline as
+    /api/v1/users/{user_id}/recommendations (content neighbours,
+    co-occurrence, popularity backfill, the user's own interactions left
+    out), without its time budget so every stage runs.
+    """
+    positions = _model.snapshot.product_positions
+    indices = np.full((len(user_seeds), top_n), -1, dtype=np.int32)
+    scores = np.zeros((len(user_seeds), top_n), dtype=np.float32)
+    for i, seeds in enumerate(user_seeds):
+        recommendations, _ = _model.get_personalized_recommendations(
+            seeds, top_n=top_n, deadline=Deadline(budget_ms=float("inf"))
+        )
+        for rank, recommendation in enumerate(recommendations):
+            indices[i, rank] = positions[recommendation['id']]
+            scores[i, rank] = recommendation['similarity_score']
+    return indices, scores
+
+def write_chunk(output: str, fmt: str, kind: str, chunk_id: int, query_ids: List[str], indices: np.ndarray, scores: np.ndarray):
+    """Write one chunk atomically (temp file + rename)"""
+    recommended = np.where(indices >= 0, _product_ids[np.maximum(indices, 0)], "")
+    name = os.path.join(output, f"{kind}-{chunk_id:05d}")
+
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        rows, ranks = np.nonzero(indices >= 0)
+        table = pa.table({
+            "query_id": np.array(query_ids, dtype=object)[rows],
+            "rank": (ranks + 1).astype(np.int16),
+            "recommended_id": recommended[rows, ranks],
+            "score": scores[rows, ranks]
+        })
+        pq.write_table(table, f"{name}.tmp.parquet")
+        os.replace(f"{name}.tmp.parquet", f"{name}.parquet")
+    else:
+        np.savez(
+            f"{name}.tmp.npz",
+            query_ids=np.array(query_ids, dtype=str),
+            recommended_ids=recommended.astype(str),
+            scores=scores
+        )
+        os.replace(f"{name}.tmp.npz", f"{name}.npz")
+
+def run_product_chunk(output: str, fmt: str, chunk_id: int, start: int, stop: int, top_n: int) -> Tuple[str, int]:
+    indices, scores = product_chunk(start, stop, top_n)
+    write_chunk(output, fmt, "products", chunk_id, _product_ids[start:stop].tolist(), indices, scores)
+    return "products", chunk_id
+
+def run_user_chunk(output: str, fmt: str, chunk_id: int, user_ids: List[str], user_seeds: List[List[Dict]], top_n: int) -> Tuple[str, int]:
+    indices, scores = user_chunk(user_seeds, top_n)
+    write_chunk(output, fmt, "users", chunk_id, user_ids, indices, scores)
+    return "users", chunk_id
+
+def load_user_seeds(active_days: Optional[int]) -> Tuple[List[str], List[List[Dict]]]:
+    """Each active user's strongest interactions, as the personalized endpoint reads them (see app/profiles.py)"""
+    user_ids, user_seeds = [], []
+    db = SessionLocal()
+    try:
+        query = db.query(
+            Product.user_id, Product.id, Product.interaction_weight, Product.interaction_type, Product.created_at
+        ).filter(Product.user_id.isnot(None))
+        if active_days:
+            query = query.filter(Product.created_at >= datetime.utcnow() - timedelta(days=active_days))
+        query = query.order_by(
+            Product.user_id, Product.interaction_weight.desc(), Product.created_at.desc()
+        ).yield_per(10000)
+
+        for user_id, product_id, weight, interaction_type, created_at in query:
+            if not user_ids or user_ids[-1] != user_id:
+                user_ids.append(user_id)
+                user_seeds.append([])
+            if len(user_seeds[-1]) < PROFILE_INTERACTIONS:
+                user_seeds[-1].append({
+                    "id": product_id,
+                    "interaction_weight": weight,
+                    "interaction_type": interaction_type,
+                    "created_at": created_at
+                })
+    finally:
+        db.close()
+    return user_ids, user_seeds
+
+def load_or_fit(model_path: str) -> ConstructionProductRecommender:
+    recommender = ConstructionProductRecommender()
+    if recommender.load(model_path):
+        print(f"Loaded model {recommender.version} from {model_path}")
+        return recommender
+
+    db = SessionLocal()
+    try:
+        recommender.fit(db)
+    finally:
+        db.close()
+    # Saved so that a resumed run scores against exactly the same model
+    recommender.save(model_path)
+    print(f"Fitted model {recommender.version} and saved it to {model_path}")
+    return recommender
+
+def read_checkpoint(output: str, expected: Dict, restart: bool) -> Dict:
+    path = os.path.join(output, CHECKPOINT_FILE)
+    if restart or not os.path.exists(path):
+        return {**expected, "done": {"products": [], "users": []}}
+
+    with open(path) as f:
+        checkpoint = json.load(f)
+    for key, value in expected.items():
+        if checkpoint.get(key) != value:
+            raise SystemExit(
+                f"{path} was written with {key}={checkpoint.get(key)!r}, not {value!r}; "
+                "use a new --output directory or pass --restart"
+            )
+    return checkpoint
+
+def write_checkpoint(output: str, checkpoint: Dict):
+    path = os.path.join(output, CHECKPOINT_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(f"{path}.tmp", path)
+
+def main(argv: Optional[List[str]] = None):
+    global _model, _product_ids
+
+    parser = argparse.ArgumentParser(description="Export top-N recommendations for all products and active users")
+    parser.add_argument("--output", required=True, help="Directory for chunk files and checkpoint.json")
+    parser.add_argument("--top-n", type=int, default=20)
+    parser.add_argument("--format", choices=["npz", "parquet"], default="npz")
+    parser.add_argument("--memory-mb", type=int, default=512, help="Memory ceiling per worker for score buffers")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (each uses --memory-mb)")
+    parser.add_argument("--active-days", type=int, default=None, help="Only users with interactions in the last N days")
+    parser.add_argument("--model-path", default=os.getenv("RECOMMENDER_MODEL_PATH"), help="Model to load (default: fit and save into --output)")
+    parser.add_argument("--skip-users", action="store_true")
+    parser.add_argument("--skip-products", action="store_true")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    args = parser.parse_args(argv)
+
+    if args.format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("--format parquet needs pyarrow (pip install pyarrow)")
+
+    os.makedirs(args.output, exist_ok=True)
+    model_path = args.model_path or os.path.join(args.output, MODEL_FILE)
+    _model = load_or_fit(model_path)
+    _product_ids = np.array(_model.snapshot.product_ids or [], dtype=object)
+    n_products = len(_product_ids)
+    if not n_products:
+        print("No products to export")
+        return
+
+    # Score buffers are (queries x products) float64, plus a working copy.
+    # Users are ranked one at a time, each costing about one similarity row
+    # per seed, so a user chunk covers the same work as a product chunk.
+    rows_per_chunk = max(1, (args.memory_mb * 1024 * 1024) // (n_products * 8 * 3))
+    users_per_chunk = max(1, rows_per_chunk // (PIPELINE_SEEDS + 1))
+
+    # Loaded even with --skip-users: chunk ids index into this list, so the
+    # checkpoint must match it before any user chunk is skipped as done
+    user_ids, user_seeds = load_user_seeds(args.active_days)
+
+    checkpoint = read_checkpoint(
+        args.output,
+        {
+            "model_version": _model.version,
+            "top_n": args.top_n,
+            "format": args.format,
+            "memory_mb": args.memory_mb,
+            "active_days": args.active_days,
+            "rows_per_chunk": rows_per_chunk,
+            "users_per_chunk": users_per_chunk,
+            "users": len(user_ids),
+            "users_sha1": hashlib.sha1("\n".join(user_ids).encode()).hexdigest()
+        },
+        args.restart
+    )
+    done = {kind: set(chunks) for kind, chunks in checkpoint["done"].items()}
+
+    tasks = []
+    if not args.skip_products:
+        for chunk_id, start in enumerate(range(0, n_products, rows_per_chunk)):
+            if chunk_id not in done["products"]:
+                tasks.append((run_product_chunk, (chunk_id, start, min(start + rows_per_chunk, n_products), args.top_n)))
+    if not args.skip_users:
+        for chunk_id, start in enumerate(range(0, len(user_ids), users_per_chunk)):
+            if chunk_id not in done["users"]:
+                stop = start + users_per_chunk
+                tasks.append((run_user_chunk, (chunk_id, user_ids[start:stop], user_seeds[start:stop], args.top_n)))
+
+    print(f"{n_products} products, {len(tasks)} chunks to write "
+          f"({rows_per_chunk} products / {users_per_chunk} users per chunk)")
+
+    started = time.perf_counter()
+
+    def record(kind: str, chunk_id: int, completed: int):
+        done[kind].add(chunk_id)
+        checkpoint["done"] = {name: sorted(chunks) for name, chunks in done.items()}
+        write_checkpoint(args.output, checkpoint)
+        print(f"[{completed}/{len(tasks)}] {kind} chunk {chunk_id} written ({time.perf_counter() - started:.1f}s)")
+
+    if args.workers <= 1:
+        for completed, (task, task_args) in enumerate(tasks, start=1):
+            record(*task(args.output, args.format, *task_args), completed)
+    else:
+        # fork so workers share the loaded model instead of unpickling it
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("fork")) as pool:
+            futures = [pool.submit(task, args.output, args.format, *task_args) for task, task_args in tasks]
+            for completed, future in enumerate(as_completed(futures), start=1):
+                record(*future.result(), completed)
+
+    print(f"Export complete in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,24 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
+from contextvars import ContextVar
+from typing import Optional
+import logging
 import os
+import time
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Get database URL from environment
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Statements slower than this (milliseconds) are logged with their SQL
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
 # Create SQLAlchemy engine
 engine = create_engine(DATABASE_URL)
 
@@ -19,6 +28,50 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Create Base class for models
 Base = declarative_base()
 
+class QueryStats:
+    """Statements, rows and database time accumulated by one request"""
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+        self.seconds = 0.0
+
+    def as_dict(self):
+        return {
+            "statements": self.statements,
+            "rows": self.rows,
+            "milliseconds": self.seconds * 1000
+        }
+
+# Stats of the request being served. Threadpool calls and tasks started by a
+# request inherit its context, so their queries are counted too; background
+# threads (sync, refit, materialization) have none and are not counted.
+query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = query_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.seconds += elapsed
+        # Rows changed here; rows read are counted as ORM objects load
+        # (below), since SQLite reports no rowcount for SELECTs
+        if not context.isddl and (context.isinsert or context.isupdate or context.isdelete) and cursor.rowcount > 0:
+            stats.rows += cursor.rowcount
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning("Slow query (%.0f ms): %s", elapsed * 1000, " ".join(statement.split())[:500])
+
+@event.listens_for(Base, "load", propagate=True)
+def _on_load(target, context):
+    stats = query_stats.get()
+    if stats is not None:
+        stats.rows += 1
+
 # Dependency to get database session
 def get_db():
     db = SessionLocal()
@@ -0,0 +1,104 @@
+import copy
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+
+# Hashed feature space; large enough that collisions between the few
+# thousand distinct catalogue terms are rare
+DEFAULT_HASH_FEATURES = 2 ** 18
+
+# Texts hashed per task when featurizing in a process pool
+DEFAULT_HASH_CHUNK_SIZE = 10000
+
+def _hasher(n_features: int):
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    # Raw term counts, like TfidfVectorizer's tf before IDF weighting
+    return HashingVectorizer(
+        n_features=n_features,
+        stop_words='english',
+        alternate_sign=False,
+        norm=None
+    )
+
+def _count_chunk(texts: List[str], n_features: int):
+    return _hasher(n_features).transform(texts)
+
+class HashingTfidfVectorizer:
+    """
+    TF-IDF over hashed terms, with IDF kept as updatable document frequencies.
+
+    Terms are mapped to columns by hashing, so there is no vocabulary pass:
+    any chunk of texts can be vectorized on its own (in a process pool for
+    large fits) and products with unseen terms can be folded in without a
+    refit. Document frequencies are plain per-column counts, so adding or
+    removing documents only adjusts the counts of their terms. Weighting
+    matches TfidfVectorizer's defaults (smooth IDF, L2-normalized rows).
+    """
+
+    def __init__(self, n_features: int = DEFAULT_HASH_FEATURES):
+        self.n_features = n_features
+        self.hasher = _hasher(n_features)
+        self.document_frequency = np.zeros(n_features, dtype=np.int64)
+        self.n_documents = 0
+        self.idf = np.ones(n_features, dtype=np.float64)
+
+    def counts(self, texts: List[str], workers: int = 1, chunk_size: int = DEFAULT_HASH_CHUNK_SIZE):
+        """Hashed term counts of ``texts`` (hashing is stateless, so chunks run in parallel)"""
+        from scipy.sparse import vstack
+
+        if workers <= 1 or len(texts) <= chunk_size:
+            return self.hasher.transform(texts)
+
+        chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            parts = list(pool.map(_count_chunk, chunks, [self.n_features] * len(chunks)))
+        return vstack(parts).tocsr()
+
+    def _document_counts(self, matrix) -> np.ndarray:
+        """Documents containing each column, for a matrix with one entry per (row, term)"""
+        return np.bincount(matrix.indices, minlength=self.n_features).astype(np.int64)
+
+    def _update_idf(self):
+        # Smooth IDF as in sklearn: ln((1 + n) / (1 + df)) + 1
+        self.idf = np.log((1 + self.n_documents) / (1 + self.document_frequency)) + 1
+
+    def _weight(self, counts):
+        """L2-normalized TF-IDF rows for hashed term counts"""
+        from sklearn.preprocessing import normalize
+
+        tfidf_matrix = counts.tocsr(copy=True)
+        tfidf_matrix.data *= self.idf[tfidf_matrix.indices]
+        return normalize(tfidf_matrix)
+
+    def fit_transform(self, texts: List[str], workers: int = 1):
+        counts = self.counts(texts, workers)
+        self.document_frequency = self._document_counts(counts)
+        self.n_documents = counts.shape[0]
+        self._update_idf()
+        return self._weight(counts)
+
+    def transform(self, texts: List[str]):
+        """TF-IDF rows under the current statistics, without counting ``texts`` as documents"""
+        return self._weight(self.hasher.transform(texts))
+
+    def updated(self, texts: List[str], removed=None) -> Tuple["HashingTfidfVectorizer", object]:
+        """
+        Copy of this vectorizer with ``texts`` added to the document counts.
+
+        ``removed`` holds the current rows (any weighting) of documents that
+        are being replaced or dropped; their terms are subtracted. Returns the
+        new vectorizer and the TF-IDF rows of ``texts`` under its statistics.
+        The original is left untouched for readers of the current model.
+        """
+        counts = self.hasher.transform(texts)
+        vectorizer = copy.copy(self)
+        vectorizer.document_frequency = self.document_frequency + self._document_counts(counts)
+        vectorizer.n_documents = self.n_documents + counts.shape[0]
+        if removed is not None and removed.shape[0]:
+            vectorizer.document_frequency -= self._document_counts(removed.tocsr())
+            vectorizer.n_documents -= removed.shape[0]
+        vectorizer._update_idf()
+        return vectorizer, vectorizer._weight(counts)
@@ -1,18 +1,57 @@
 from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import List, Dict, Any, Optional
 import uvicorn
 from datetime import datetime
+import logging
+import threading
+import orjson
+import anyio.to_thread
 
-from .database import get_db, engine
+from .database import get_db, engine, SessionLocal, QueryStats, query_stats
 from .models import Product, ProductImage, Base
-from .recommender import recommender
+from .recommender import recommender, normalize_category
+from .sync import ChangeDataSync
+from .materialize import NeighborMaterializer
+from .singleflight import SingleFlight
+from .refit import RefitScheduler
+from .profiles import UserProfileCache, interaction_seed
+from .admission import AdmissionControl, Overloaded
+from .pipeline import Deadline
+from .streaming import iter_interactions_ndjson, decode_resume_token, DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.datastructures import MutableHeaders
 import os
+import time
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+# Optional path of a saved model; when present it is loaded instead of refitting
+MODEL_PATH = os.getenv("RECOMMENDER_MODEL_PATH")
+
+# Seconds a client should wait before retrying while the model warms up
+MODEL_RETRY_AFTER = os.getenv("RECOMMENDER_RETRY_AFTER", "5")
+
+# Seconds before a failed model load or fit at startup is retried, doubling per failure
+WARM_UP_RETRY_BACKOFF = float(os.getenv("RECOMMENDER_WARM_UP_RETRY_BACKOFF", "5"))
+WARM_UP_MAX_BACKOFF = 300
+
+# Fold products that exist in the database but not yet in the model into it
+# when they are asked for, instead of answering with no recommendations
+FOLD_IN_NEW_PRODUCTS = os.getenv("RECOMMENDER_FOLD_IN_NEW_PRODUCTS", "0") == "1"
+
+# Threads available to sync endpoints, dependencies and run_in_threadpool
+# (blocking database calls run there); 0 keeps AnyIO's default of 40
+THREADPOOL_SIZE = int(os.getenv("RECOMMENDER_THREADPOOL_SIZE", "0"))
+
+# Report each request's database statements, rows and time in X-DB-* response headers
+SQL_DEBUG_HEADERS = os.getenv("SQL_DEBUG_HEADERS", "0") == "1"
+
+# Requests slower than this (milliseconds) are logged with their database usage
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -33,6 +72,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class QueryStatsMiddleware:
+    """
+    Count the database work of every request (see app/database.py).
+
+    Plain ASGI rather than BaseHTTPMiddleware, so the hot paths pay only
+    for a context variable. Streaming responses send their headers before
+    streaming, so their X-DB-* headers cover only the work done up to then.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        stats = QueryStats()
+        token = query_stats.set(stats)
+        started = time.perf_counter()
+        
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and SQL_DEBUG_HEADERS:
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Queries"] = str(stats.statements)
+                headers["X-DB-Rows"] = str(stats.rows)
+                headers["X-DB-Time-Ms"] = f"{stats.seconds * 1000:.1f}"
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            query_stats.reset(token)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if elapsed_ms >= SLOW_REQUEST_MS:
+                logger.warning(
+                    "Slow request %s %s: %.0f ms, %d queries (%.0f ms), %d rows",
+                    scope["method"], scope["path"], elapsed_ms, stats.statements, stats.seconds * 1000, stats.rows
+                )
+
+app.add_middleware(QueryStatsMiddleware)
+
 # Pydantic schemas
 from pydantic import BaseModel
 
@@ -61,7 +142,7 @@ class ProductCreate(BaseModel):
 
 class ProductResponse(BaseModel):
     id: str
-    product_id: str
+    product_id: Optional[str] = None
     name: str
     description: str
     price: float
@@ -85,15 +166,165 @@ class RecommendationResponse(BaseModel):
     success: bool = True
     data: Dict[str, Any]
 
+def encoded_recommendation_response(product_id: str, recommendations_json: bytes) -> Response:
+    """
+    Wrap pre-encoded recommendations in the RecommendationResponse wire format.
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize the recommender when the app starts"""
-    db = next(get_db())
+    Skips pydantic validation and jsonable_encoder for the hot /recommend path.
+    """
+    body = (
+        b'{"success":true,"data":{"product_id":' + orjson.dumps(product_id)
+        + b',"recommendations":' + recommendations_json + b'}}'
+    )
+    return Response(content=body, media_type="application/json")
+
+
+# Shares one in-flight computation between concurrent identical recommendation requests
+recommendation_flights = SingleFlight()
+
+# Per-route-class concurrency limits; excess requests are shed instead of queueing without bound
+admission = AdmissionControl()
+
+# Recent strongest interactions of active users, so personalized requests skip the database
+user_profiles = UserProfileCache()
+
+# Writes each built model's neighbours to product_neighbors for other services
+neighbor_materializer = NeighborMaterializer(recommender)
+
+def model_built():
+    """Persist and publish a freshly built or updated model"""
+    if MODEL_PATH:
+        recommender.save(MODEL_PATH)
+    neighbor_materializer.request()
+
+# Picks up products written directly to the database by other services
+model_sync = ChangeDataSync(recommender, on_change=model_built, on_products=user_profiles.add_interactions)
+
+def rebuild_model():
+    """Full refit from the database, run by the refit scheduler"""
+    db = SessionLocal()
     try:
         recommender.fit(db)
     finally:
         db.close()
+    model_built()
+
+# Coalesces write-triggered refits into debounced background rebuilds,
+# held back while the API is shedding load
+refit_scheduler = RefitScheduler(rebuild_model, busy=admission.under_pressure)
+
+# Set on shutdown so a warm-up that keeps failing stops retrying
+warm_up_stopping = threading.Event()
+
+def load_saved_model() -> bool:
+    """Load the model artifact at MODEL_PATH; False (so the caller fits) when it is missing or unreadable"""
+    try:
+        loaded = recommender.load(MODEL_PATH)
+    except Exception:
+        logger.exception("Could not load recommender model from %s; fitting instead", MODEL_PATH)
+        return False
+    if loaded:
+        logger.info("Loaded recommender model from %s", MODEL_PATH)
+    return loaded
+
+def warm_up_model():
+    """Create tables and load or fit the recommender off the request path, retrying with backoff until it succeeds"""
+    backoff = WARM_UP_RETRY_BACKOFF
+    while True:
+        try:
+            # Create database tables
+            Base.metadata.create_all(bind=engine)
+            
+            if not load_saved_model():
+                db = SessionLocal()
+                try:
+                    recommender.fit(db)
+                finally:
+                    db.close()
+            model_built()
+            break
+        except Exception:
+            logger.exception("Recommender warm-up failed; retrying in %.0f s", backoff)
+        if warm_up_stopping.wait(backoff):
+            return
+        backoff = min(backoff * 2, WARM_UP_MAX_BACKOFF)
+    
+    # A loaded model catches up from its saved watermark on the first poll
+    model_sync.start()
+
+def recommendation_filters(
+    category: Optional[str] = Query(None, description="Only recommend products in these categories (comma-separated)"),
+    min_price: Optional[float] = Query(None, ge=0, description="Minimum price"),
+    max_price: Optional[float] = Query(None, ge=0, description="Maximum price"),
+    in_stock: bool = Query(False, description="Only recommend products with stock > 0")
+) -> Dict[str, Any]:
+    """Shared filter parameters for the recommendation endpoints"""
+    return {
+        "category": category,
+        "min_price": min_price,
+        "max_price": max_price,
+        "in_stock": in_stock
+    }
+
+def filter_by_category(query, category: str):
+    """Exact, case-insensitive category filter backed by ix_products_category_normalized"""
+    categories = [normalize_category(name) for name in category.split(",")]
+    return query.filter(func.lower(func.trim(Product.category)).in_(categories))
+
+def apply_product_filters(query, filters: Dict[str, Any]):
+    """Apply recommendation filters to a SQL product query"""
+    if filters["category"]:
+        query = filter_by_category(query, filters["category"])
+    if filters["min_price"] is not None:
+        query = query.filter(Product.price >= filters["min_price"])
+    if filters["max_price"] is not None:
+        query = query.filter(Product.price <= filters["max_price"])
+    if filters["in_stock"]:
+        query = query.filter(Product.stock > 0)
+    return query
+
+def require_model():
+    """Fail fast with 503 while the recommender is still warming up"""
+    if not recommender.is_ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Recommendation model is not ready yet",
+            headers={"Retry-After": MODEL_RETRY_AFTER}
+        )
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc: Overloaded):
+    """Fast rejection of requests shed by admission control"""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": f"Server overloaded ({exc.reason}), retry later"},
+        headers={"Retry-After": exc.retry_after}
+    )
+
+async def write_slot():
+    """Dependency holding one of the write route class's slots for the request"""
+    limiter = admission["write"]
+    await limiter.acquire()
+    try:
+        yield
+    finally:
+        limiter.release()
+
+@app.on_event("startup")
+async def startup_event():
+    """Start warming up the recommender without blocking the server"""
+    if THREADPOOL_SIZE > 0:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    warm_up_stopping.clear()
+    threading.Thread(target=warm_up_model, name="recommender-warm-up", daemon=True).start()
+    refit_scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the background warm-up, sync and refit threads"""
+    warm_up_stopping.set()
+    model_sync.stop()
+    refit_scheduler.stop()
 
 @app.get("/")
 async def root():
@@ -106,6 +337,7 @@ async def root():
             "recommendations": "/api/v1/recommend/{product_id}",
             "products": "/api/v1/products",
             "user_recommendations": "/api/v1/users/{user_id}/recommendations",
+            "ready": "/ready",
             "docs": "/docs"
         }
     }
@@ -119,38 +351,70 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat() + "Z"
     }
 
-@app.get("/api/v1/recommend/{product_id}")
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the recommendation model can serve queries"""
+    return JSONResponse(
+        status_code=200 if recommender.is_ready else 503,
+        content={
+            "ready": recommender.is_ready,
+            # Worker process that answered, so multi-worker deployments can be told apart
+            "pid": os.getpid(),
+            "model": recommender.status_info(),
+            "timestamp": datetime.utcnow().isoformat() + "Z"
+        }
+    )
+
+@app.get("/api/v1/recommend/{product_id}", response_model=RecommendationResponse)
 async def get_recommendations(
     product_id: str, 
     top_n: int = 5,
-    db: Session = Depends(get_db)
+    filters: Dict[str, Any] = Depends(recommendation_filters)
 ):
     """
     Get AI-based product recommendations for a given construction product ID
     
     - **product_id**: The ID of the product to get recommendations for
     - **top_n**: Number of recommendations to return (default: 5)
+    - **category**, **min_price**, **max_price**, **in_stock**: Optional filters applied before ranking
     """
-    # Check if product exists
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    # Get recommendations
-    recommendations = recommender.get_recommendations(product_id, top_n)
+    require_model()
     
-    return RecommendationResponse(
-        data={
-            "product_id": product_id,
-            "recommendations": recommendations
-        }
+    # Concurrent identical requests share one existence check and scoring pass
+    key = ("recommend", product_id, top_n, tuple(sorted(filters.items())))
+    recommendations_json = await recommendation_flights.do(
+        key, lambda: admission["recommend"].run(run_in_threadpool, compute_recommendations_json, product_id, top_n, filters)
     )
+    
+    return encoded_recommendation_response(product_id, recommendations_json)
+
+def compute_recommendations_json(product_id: str, top_n: int, filters: Dict[str, Any]) -> bytes:
+    """Existence check and scoring behind /recommend, encoded as JSON"""
+    # Products in the model snapshot exist; only newer ids need the database
+    if not recommender.has_product(product_id):
+        # The computation may outlive the request that started it, so it owns its session
+        db = SessionLocal()
+        try:
+            # Check if product exists
+            product = db.query(Product).filter(Product.id == product_id).first()
+            images = recommender.default_images_of(db, [product_id]) if product and FOLD_IN_NEW_PRODUCTS else None
+        finally:
+            db.close()
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        
+        if FOLD_IN_NEW_PRODUCTS:
+            # Leave the watermark alone so the sync loop still sees older changes
+            recommender.apply_changes([product], advance_watermark=False, images=images)
+    
+    # Get recommendations, already encoded as JSON
+    return recommender.get_recommendations_json(product_id, top_n, **filters)
 
 @app.get("/api/v1/products", response_model=PaginatedProductsResponse)
 async def get_products(
     page: int = Query(1, ge=1, description="Page number"),
     limit: int = Query(10, ge=1, le=100, description="Number of products per page"),
-    category: Optional[str] = Query(None, description="Filter by category"),
+    category: Optional[str] = Query(None, description="Filter by category (exact, case-insensitive; comma-separated)"),
     db: Session = Depends(get_db)
 ):
     """Get paginated construction products with optional category filtering"""
@@ -160,7 +424,7 @@ async def get_products(
     
     # Apply category filter if provided
     if category:
-        query = query.filter(Product.category.ilike(f"%{category}%"))
+        query = filter_by_category(query, category)
     
     # Get total count
     total = query.count()
@@ -169,14 +433,20 @@ async def get_products(
     offset = (page - 1) * limit
     products = query.offset(offset).limit(limit).all()
     
-    # Get images for each product
+    # Get the images of the whole page in one query
+    images_by_product = {}
+    if products:
+        images = db.query(ProductImage).filter(
+            ProductImage.product_id.in_([product.id for product in products])
+        ).all()
+        for img in images:
+            images_by_product.setdefault(img.product_id, []).append(img)
+    
     product_responses = []
     for product in products:
-        images = db.query(ProductImage).filter(ProductImage.product_id == product.id).all()
-        
         # Convert images to response format
         image_responses = []
-        for img in images:
+        for img in images_by_product.get(product.id, []):
             image_responses.append(ProductImageResponse(
                 id=img.id,
                 url=img.url,
@@ -189,6 +459,7 @@ async def get_products(
         
         product_responses.append(ProductResponse(
             id=product.id,
+            product_id=product.product_id,
             name=product.name,
             description=product.description,
             price=product.price,
@@ -214,8 +485,26 @@ async def get_products(
         }
     )
 
-@app.post("/api/v1/products", response_model=ProductResponse)
-async def create_product(
+@app.get("/api/v1/products/search")
+async def search_products(
+    q: str = Query(..., min_length=1, description="Search text"),
+    limit: int = Query(10, ge=1, le=100, description="Maximum number of results"),
+    filters: Dict[str, Any] = Depends(recommendation_filters)
+):
+    """Ranked free-text search over product names, descriptions and categories"""
+    require_model()
+    
+    results = await admission["recommend"].run(run_in_threadpool, recommender.search, q, limit, **filters)
+    return {
+        "success": True,
+        "data": {
+            "query": q,
+            "results": results
+        }
+    }
+
+@app.post("/api/v1/products", response_model=ProductResponse, dependencies=[Depends(write_slot)])
+def create_product(
     product: ProductCreate,
     db: Session = Depends(get_db)
 ):
@@ -246,8 +535,14 @@ async def create_product(
     db.commit()
     db.refresh(new_product)
     
-    # Refit the recommender with new data
-    recommender.fit(db)
+    # Keep a cached profile of this user current without another query
+    user_profiles.add_interaction(new_product)
+    
+    # Sharded models fold new rows into their categories' shards, so let the
+    # sync loop pick this one up in the background; otherwise schedule a
+    # refit. Either way bursts of writes share one rebuild.
+    if recommender.snapshot.shard_index is None or not model_sync.request():
+        refit_scheduler.mark_dirty()
     
     return ProductResponse(
         id=new_product.id,
@@ -263,8 +558,8 @@ async def create_product(
         images=[]
     )
 
-@app.delete("/api/v1/products/{product_id}")
-async def delete_product(product_id: str, db: Session = Depends(get_db)):
+@app.delete("/api/v1/products/{product_id}", dependencies=[Depends(write_slot)])
+def delete_product(product_id: str, db: Session = Depends(get_db)):
     """Delete a construction product by ID"""
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
@@ -274,11 +569,14 @@ async def delete_product(product_id: str, db: Session = Depends(get_db)):
     db.query(ProductImage).filter(ProductImage.product_id == product_id).delete()
     
     # Delete the product
+    user_id = product.user_id
     db.delete(product)
     db.commit()
+    user_profiles.invalidate(user_id)
     
-    # Refit the recommender with updated data
-    recommender.fit(db)
+    # Schedule a refit with the updated data (folding in cannot remove rows,
+    # so this is a full refit in every mode)
+    refit_scheduler.mark_dirty()
     
     return {"success": True, "message": f"Product {product_id} deleted successfully"}
 
@@ -286,24 +584,82 @@ async def delete_product(product_id: str, db: Session = Depends(get_db)):
 async def get_user_recommendations(
     user_id: str,
     top_n: int = 5,
-    db: Session = Depends(get_db)
+    filters: Dict[str, Any] = Depends(recommendation_filters)
 ):
     """Get personalized recommendations for a specific user based on their product interactions"""
     
-    # Get user's products with interaction data
-    user_products = db.query(Product).filter(
-        Product.user_id == user_id
-    ).order_by(Product.interaction_weight.desc(), Product.created_at.desc()).limit(20).all()
+    # The time budget starts now, so queueing for a slot counts against it
+    deadline = Deadline()
+    
+    # Concurrent identical requests share one computation
+    key = ("user", user_id, top_n, tuple(sorted(filters.items())))
+    try:
+        return await recommendation_flights.do(
+            key, lambda: admission["personalized"].run(
+                run_in_threadpool, compute_user_recommendations, user_id, top_n, filters, deadline
+            )
+        )
+    except Overloaded:
+        if not recommender.is_ready:
+            raise
+        # Degrade to the popularity list held by the model: no database, no scoring
+        admission["personalized"].degraded += 1
+        return RecommendationResponse(
+            data={
+                "user_id": user_id,
+                "type": "popular",
+                "degraded": True,
+                "recommendations": recommender.get_popular(top_n, **filters)
+            }
+        )
+
+def compute_user_recommendations(
+    user_id: str,
+    top_n: int,
+    filters: Dict[str, Any],
+    deadline: Optional[Deadline] = None
+) -> RecommendationResponse:
+    """Personalized recommendations, falling back to popular products"""
+    # Cached profiles of active users need no database access at all
+    seeds = user_profiles.get(user_id) if recommender.is_ready else None
+    if seeds:
+        return personalized_recommendations(user_id, seeds, top_n, filters, deadline)
     
-    if not user_products:
-        # If no user products, return popular products (highest interaction weight)
-        popular_products = db.query(Product).filter(
+    db = SessionLocal()
+    try:
+        return _compute_user_recommendations(db, user_id, top_n, filters, seeds, deadline)
+    finally:
+        db.close()
+
+def _compute_user_recommendations(
+    db: Session,
+    user_id: str,
+    top_n: int,
+    filters: Dict[str, Any],
+    seeds: Optional[List[Dict[str, Any]]] = None,
+    deadline: Optional[Deadline] = None
+) -> RecommendationResponse:
+    if seeds is None:
+        # Taken before the query, so a write racing with it is never cached over
+        token = user_profiles.token()
+        
+        # Get user's products with interaction data
+        user_products = db.query(Product).filter(
+            Product.user_id == user_id
+        ).order_by(Product.interaction_weight.desc(), Product.created_at.desc()).limit(20).all()
+        seeds = [interaction_seed(product) for product in user_products]
+        if recommender.is_ready:
+            user_profiles.put(user_id, seeds, token)
+    
+    if not seeds or not recommender.is_ready:
+        # If no user products (or the model is still warming up), return popular products (highest interaction weight)
+        popular_products = apply_product_filters(db.query(Product), filters).filter(
             Product.interaction_weight.isnot(None)
         ).order_by(Product.interaction_weight.desc()).limit(top_n).all()
         
         if not popular_products:
             # Fallback to newest products
-            popular_products = db.query(Product).order_by(Product.created_at.desc()).limit(top_n).all()
+            popular_products = apply_product_filters(db.query(Product), filters).order_by(Product.created_at.desc()).limit(top_n).all()
         
         return RecommendationResponse(
             data={
@@ -326,54 +682,89 @@ async def get_user_recommendations(
             }
         )
     
-    # Get AI recommendations for each user product
-    all_recommendations = []
-    
-    for product in user_products[:5]:  # Top 5 user products by weight
-        try:
-            recommendations = recommender.get_recommendations(product.id, top_n=3)
-            # Boost similarity score based on user interaction weight
-            for rec in recommendations:
-                boost_factor = (product.interaction_weight or 1.0) * 0.1
-                rec['similarity_score'] = min(1.0, rec['similarity_score'] + boost_factor)
-                rec['interaction_weight'] = product.interaction_weight
-                rec['interaction_type'] = product.interaction_type
-            all_recommendations.extend(recommendations)
-        except:
-            continue
-    
-    # Remove duplicates and sort by similarity score
-    unique_recommendations = []
-    seen_ids = set()
-    for rec in all_recommendations:
-        if rec['id'] not in seen_ids:
-            unique_recommendations.append(rec)
-            seen_ids.add(rec['id'])
-    
-    # Sort by similarity score and take top N
-    unique_recommendations.sort(key=lambda x: x['similarity_score'], reverse=True)
-    final_recommendations = unique_recommendations[:top_n]
+    return personalized_recommendations(user_id, seeds, top_n, filters, deadline)
+
+def personalized_recommendations(
+    user_id: str,
+    seeds: List[Dict[str, Any]],
+    top_n: int,
+    filters: Dict[str, Any],
+    deadline: Optional[Deadline] = None
+) -> RecommendationResponse:
+    """Rank candidates for a user's strongest interactions (see app/pipeline.py)"""
+    final_recommendations, pipeline = recommender.get_personalized_recommendations(
+        seeds, top_n=top_n, deadline=deadline, **filters
+    )
     
     return RecommendationResponse(
         data={
             "user_id": user_id,
             "type": "personalized",
             "recommendations": final_recommendations,
-            "based_on_products": len(user_products)
+            "based_on_products": len(seeds),
+            "pipeline": pipeline
         }
     )
 
+def stream_interactions(user_id: Optional[str], after: Optional[str], chunk_size: int) -> StreamingResponse:
+    """Build an NDJSON streaming response over the interaction rows"""
+    if after:
+        try:
+            decode_resume_token(after)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid resume token")
+    
+    return StreamingResponse(
+        iter_interactions_ndjson(user_id=user_id, after=after, chunk_size=chunk_size),
+        media_type="application/x-ndjson"
+    )
+
+@app.get("/api/v1/model/status")
+async def get_model_status():
+    """Model state, pending write-triggered changes and time since the last build"""
+    fitted_at = recommender.fitted_at
+    return {
+        "success": True,
+        "data": {
+            "model": recommender.status_info(),
+            "seconds_since_last_build": (datetime.utcnow() - fitted_at).total_seconds() if fitted_at else None,
+            "refit": refit_scheduler.stats()
+        }
+    }
+
+@app.get("/api/v1/metrics")
+async def get_metrics():
+    """Internal counters for load and capacity monitoring"""
+    return {
+        "success": True,
+        "data": {
+            "singleflight": recommendation_flights.stats(),
+            "admission": admission.stats(),
+            "user_profiles": user_profiles.stats()
+        }
+    }
+
 @app.get("/api/v1/users/{user_id}/products")
 async def get_user_products(
     user_id: str,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json for a page, ndjson to stream the full history"),
+    after: Optional[str] = Query(None, description="Resume token from a previous ndjson export"),
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=MAX_CHUNK_SIZE, description="Rows per server-side cursor fetch")
 ):
     """Get user's product interaction history"""
     
-    products = db.query(Product).filter(
-        Product.user_id == user_id
-    ).order_by(Product.created_at.desc()).limit(limit).all()
+    if format == "ndjson":
+        # The stream reads through its own session, so none is opened for it here
+        return stream_interactions(user_id, after, chunk_size)
+    
+    db = SessionLocal()
+    try:
+        products = db.query(Product).filter(
+            Product.user_id == user_id
+        ).order_by(Product.created_at.desc()).limit(limit).all()
+    finally:
+        db.close()
     
     return {
         "success": True,
@@ -393,5 +784,14 @@ async def get_user_products(
         ]
     }
 
+@app.get("/api/v1/interactions/export")
+async def export_interactions(
+    user_id: Optional[str] = Query(None, description="Limit the export to one user"),
+    after: Optional[str] = Query(None, description="Resume token from a previous export"),
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=MAX_CHUNK_SIZE, description="Rows per server-side cursor fetch")
+):
+    """Stream every user's interaction history as NDJSON"""
+    return stream_interactions(user_id, after, chunk_size)
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,176 @@
+import logging
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import case, update
+
+from .database import engine
+from .models import ModelVersion, ProductNeighbor
+from .recommender import ConstructionProductRecommender
+
+logger = logging.getLogger(__name__)
+
+# Write product_neighbors after each model build (off by default)
+MATERIALIZE_NEIGHBORS = os.getenv("RECOMMENDER_MATERIALIZE_NEIGHBORS", "0") == "1"
+
+# Neighbours written per product
+MATERIALIZE_TOP_K = int(os.getenv("RECOMMENDER_MATERIALIZE_TOP_K", "20"))
+
+# Rows per bulk upsert statement
+MATERIALIZE_BATCH_SIZE = int(os.getenv("RECOMMENDER_MATERIALIZE_BATCH_SIZE", "5000"))
+
+# Inactive versions kept around for readers that looked up the old version
+MATERIALIZE_KEEP_VERSIONS = 1
+
+def _upsert_statement(connection):
+    """INSERT ... ON CONFLICT DO UPDATE for product_neighbors on this dialect"""
+    if connection.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif connection.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+
+    statement = insert(ProductNeighbor)
+    return statement.on_conflict_do_update(
+        index_elements=["model_version", "product_id", "rank"],
+        set_={
+            "neighbor_id": statement.excluded.neighbor_id,
+            "score": statement.excluded.score
+        }
+    )
+
+def materialize_neighbors(
+    recommender: ConstructionProductRecommender,
+    k: int = MATERIALIZE_TOP_K,
+    batch_size: int = MATERIALIZE_BATCH_SIZE
+) -> Optional[str]:
+    """
+    Write every product's top-K neighbours to product_neighbors and make them active.
+
+    All rows for the model's version are upserted in batches and the active
+    version is switched in the same transaction, so readers see either the
+    complete old table or the complete new one. Versions older than the
+    previous one are removed afterwards. Returns the materialized version,
+    or None when there was nothing to write.
+    """
+    # One snapshot throughout, so ids and neighbour lists belong to the same version
+    snapshot = recommender.snapshot
+    version = snapshot.version
+    product_ids = snapshot.product_ids
+    if not recommender.is_ready or version is None or not product_ids:
+        return None
+
+    indices, scores = snapshot.neighbor_lists(k)
+    product_ids = np.array(product_ids, dtype=object)
+
+    with engine.begin() as connection:
+        current = connection.execute(
+            ModelVersion.__table__.select().where(ModelVersion.version == version)
+        ).first()
+        if current is not None and current.is_active:
+            return version
+
+        upsert = _upsert_statement(connection)
+        if upsert is None:
+            # Generic fallback: clear any partial rows of this version, then insert
+            connection.execute(ProductNeighbor.__table__.delete().where(ProductNeighbor.model_version == version))
+            upsert = ProductNeighbor.__table__.insert()
+
+        rows_per_batch = max(1, batch_size // max(1, indices.shape[1]))
+        for start in range(0, len(product_ids), rows_per_batch):
+            block_indices = indices[start:start + rows_per_batch]
+            block_scores = scores[start:start + rows_per_batch]
+            rows, ranks = np.nonzero(block_indices >= 0)
+            if not len(rows):
+                continue
+            connection.execute(upsert, [
+                {
+                    "model_version": version,
+                    "product_id": product_id,
+                    "rank": rank,
+                    "neighbor_id": neighbor_id,
+                    "score": score
+                }
+                for product_id, rank, neighbor_id, score in zip(
+                    product_ids[start + rows].tolist(),
+                    (ranks + 1).tolist(),
+                    product_ids[block_indices[rows, ranks]].tolist(),
+                    block_scores[rows, ranks].astype(float).tolist()
+                )
+            ])
+
+        if current is None:
+            connection.execute(ModelVersion.__table__.insert().values(
+                version=version,
+                is_active=0,
+                product_count=len(product_ids),
+                neighbors_per_product=int(indices.shape[1])
+            ))
+        # Atomic swap: the new version becomes the only active one at commit
+        connection.execute(
+            update(ModelVersion).values(
+                is_active=case((ModelVersion.version == version, 1), else_=0)
+            )
+        )
+
+    _drop_old_versions(version)
+    return version
+
+def _drop_old_versions(active_version: str):
+    """Delete neighbours of inactive versions beyond the most recent previous ones"""
+    with engine.begin() as connection:
+        stale = [
+            row.version
+            for row in connection.execute(
+                ModelVersion.__table__.select()
+                .where(ModelVersion.version != active_version)
+                .order_by(ModelVersion.created_at.desc())
+                .offset(MATERIALIZE_KEEP_VERSIONS)
+            )
+        ]
+        if stale:
+            connection.execute(ProductNeighbor.__table__.delete().where(ProductNeighbor.model_version.in_(stale)))
+            connection.execute(ModelVersion.__table__.delete().where(ModelVersion.version.in_(stale)))
+
+class NeighborMaterializer:
+    """
+    Run materialize_neighbors in the background after model builds.
+
+    Builds that arrive while a run is in progress are coalesced into one
+    follow-up run against whatever model is current by then.
+    """
+
+    def __init__(self, recommender: ConstructionProductRecommender, enabled: bool = MATERIALIZE_NEIGHBORS):
+        self.recommender = recommender
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._running = False
+        self._pending = False
+
+    def request(self):
+        """Ask for the current model to be materialized"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._running:
+                self._pending = True
+                return
+            self._running = True
+        threading.Thread(target=self._run, name="recommender-materialize", daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                version = materialize_neighbors(self.recommender)
+                if version:
+                    logger.info("Materialized product neighbours for model %s", version)
+            except Exception:
+                logger.exception("Materializing product neighbours failed")
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    return
+                self._pending = False
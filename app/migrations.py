@@ -0,0 +1,311 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from .models import Product, ProductImage, ModelVersion, ProductNeighbor, SchemaMigration
+
+logger = logging.getLogger(__name__)
+
+# Rows updated per backfill transaction (adapted at run time, never above this)
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+
+# Seconds to sleep between backfill batches so the API keeps its share of the database
+MIGRATION_BATCH_PAUSE = float(os.getenv("MIGRATION_BATCH_PAUSE", "0.05"))
+
+# Batches are resized to take about this long, keeping row locks short
+MIGRATION_BATCH_SECONDS = float(os.getenv("MIGRATION_BATCH_SECONDS", "0.5"))
+
+# PostgreSQL: give up on DDL instead of queueing every query behind its lock
+MIGRATION_LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "5s")
+
+class Operation:
+    """One idempotent step of a migration"""
+
+    def apply(self, runner: "MigrationRunner", migration: "Migration", checkpoint: Optional[str]):
+        raise NotImplementedError
+
+class CreateTable(Operation):
+    def __init__(self, table):
+        self.table = table
+
+    def __repr__(self):
+        return f"CreateTable({self.table.name})"
+
+    def apply(self, runner, migration, checkpoint):
+        with runner.ddl() as connection:
+            self.table.create(connection, checkfirst=True)
+
+class AddColumn(Operation):
+    """ALTER TABLE ... ADD COLUMN when the column is missing (metadata-only for nullable/constant defaults)"""
+
+    def __init__(self, table: str, column: str, ddl: str):
+        self.table = table
+        self.column = column
+        self.ddl = ddl
+
+    def __repr__(self):
+        return f"AddColumn({self.table}.{self.column})"
+
+    def apply(self, runner, migration, checkpoint):
+        with runner.ddl() as connection:
+            columns = {column["name"] for column in inspect(connection).get_columns(self.table)}
+            if self.column not in columns:
+                connection.execute(text(f"ALTER TABLE {self.table} ADD COLUMN {self.column} {self.ddl}"))
+
+class CreateIndex(Operation):
+    """
+    CREATE INDEX without blocking writes.
+
+    Uses CREATE INDEX CONCURRENTLY on PostgreSQL (dropping an invalid index
+    left by an interrupted earlier attempt first). Plain column indexes are
+    skipped when an index on the same columns already exists under another name.
+    """
+
+    def __init__(self, name: str, table: str, expression: str, columns: Optional[List[str]] = None):
+        self.name = name
+        self.table = table
+        self.expression = expression
+        self.columns = columns
+
+    def __repr__(self):
+        return f"CreateIndex({self.name})"
+
+    def apply(self, runner, migration, checkpoint):
+        if self.columns:
+            with runner.engine.connect() as connection:
+                existing = inspect(connection).get_indexes(self.table)
+            if any(index["name"] != self.name and index["column_names"] == self.columns for index in existing):
+                return
+
+        if not runner.is_postgresql:
+            with runner.ddl() as connection:
+                connection.execute(text(f"CREATE INDEX IF NOT EXISTS {self.name} ON {self.table} ({self.expression})"))
+            return
+
+        # CONCURRENTLY cannot run inside a transaction block
+        with runner.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            invalid = connection.execute(text(
+                "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ), {"name": self.name}).first()
+            if invalid:
+                connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {self.name}"))
+            connection.execute(text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {self.name} ON {self.table} ({self.expression})"
+            ))
+
+class Backfill(Operation):
+    """
+    UPDATE a table in primary-key ranges of bounded size.
+
+    Each batch updates the rows with ``key`` in (last, upper] matching
+    ``where`` and records ``upper`` as the migration's checkpoint in the same
+    transaction, so an interrupted run resumes after the last committed batch.
+    """
+
+    def __init__(self, table: str, assignments: str, where: str, key: str = "id"):
+        self.table = table
+        self.assignments = assignments
+        self.where = where
+        self.key = key
+
+    def __repr__(self):
+        return f"Backfill({self.table}: {self.assignments})"
+
+    def apply(self, runner, migration, checkpoint):
+        key, table = self.key, self.table
+        last = checkpoint
+        batch_size = runner.batch_size
+        while True:
+            started = time.monotonic()
+            with runner.engine.begin() as connection:
+                after = f"WHERE {key} > :last" if last is not None else ""
+                # Upper bound of the next key range: the batch_size-th key after the checkpoint
+                upper = connection.execute(
+                    text(f"SELECT {key} FROM {table} {after} ORDER BY {key} LIMIT 1 OFFSET :offset"),
+                    {"last": last, "offset": batch_size - 1}
+                ).scalar()
+                if upper is None:
+                    upper = connection.execute(text(f"SELECT MAX({key}) FROM {table} {after}"), {"last": last}).scalar()
+                if upper is None:
+                    return
+
+                lower = f"{key} > :last AND " if last is not None else ""
+                updated = connection.execute(
+                    text(f"UPDATE {table} SET {self.assignments} WHERE {lower}{key} <= :upper AND ({self.where})"),
+                    {"last": last, "upper": upper}
+                ).rowcount
+                runner.checkpoint(connection, migration, upper, max(updated, 0))
+            last = upper
+
+            # Throttle: resize batches toward the target duration, then yield to other clients
+            elapsed = time.monotonic() - started
+            if elapsed > MIGRATION_BATCH_SECONDS * 2:
+                batch_size = max(1, batch_size // 2)
+            elif elapsed < MIGRATION_BATCH_SECONDS / 2:
+                batch_size = min(runner.batch_size, batch_size * 2)
+            if runner.pause:
+                time.sleep(runner.pause)
+
+class Migration:
+    def __init__(self, version: str, description: str, operations: List[Operation]):
+        self.version = version
+        self.description = description
+        self.operations = operations
+
+# Ordered schema history of the products database. Every operation is
+# idempotent, so databases set up by the old one-shot scripts or by
+# create_all() converge on the same schema. Append new migrations; never
+# edit applied ones.
+MIGRATIONS = [
+    Migration("0001", "Create products and product_images", [
+        CreateTable(Product.__table__),
+        CreateTable(ProductImage.__table__),
+    ]),
+    Migration("0002", "Product details and timestamps", [
+        AddColumn("products", "description", "TEXT"),
+        AddColumn("products", "stock", "INTEGER DEFAULT 0"),
+        AddColumn("products", "created_at", "TIMESTAMP"),
+        AddColumn("products", "updated_at", "TIMESTAMP"),
+        Backfill(
+            "products",
+            "created_at = COALESCE(created_at, CURRENT_TIMESTAMP), updated_at = COALESCE(updated_at, CURRENT_TIMESTAMP)",
+            "created_at IS NULL OR updated_at IS NULL"
+        ),
+    ]),
+    Migration("0003", "User interaction fields", [
+        AddColumn("products", "product_id", "VARCHAR"),
+        AddColumn("products", "user_id", "VARCHAR"),
+        AddColumn("products", "interaction_weight", "FLOAT DEFAULT 1.0"),
+        AddColumn("products", "interaction_type", "VARCHAR"),
+        Backfill("products", "interaction_weight = 1.0", "interaction_weight IS NULL"),
+        CreateIndex("idx_products_product_id", "products", "product_id", columns=["product_id"]),
+        CreateIndex("idx_products_user_id", "products", "user_id", columns=["user_id"]),
+        CreateIndex("idx_products_interaction_weight", "products", "interaction_weight", columns=["interaction_weight"]),
+        CreateIndex("idx_products_interaction_type", "products", "interaction_type", columns=["interaction_type"]),
+    ]),
+    Migration("0004", "Normalized category index", [
+        CreateIndex("ix_products_category_normalized", "products", "lower(trim(category))"),
+    ]),
+    Migration("0005", "Materialized neighbour tables", [
+        CreateTable(ModelVersion.__table__),
+        CreateTable(ProductNeighbor.__table__),
+    ]),
+]
+
+class MigrationRunner:
+    """
+    Apply MIGRATIONS in order, recording progress in schema_migrations.
+
+    DDL runs in short transactions (with a lock timeout on PostgreSQL) and
+    data changes run as throttled, checkpointed Backfill batches, so the API
+    can keep serving while a migration runs and a failed or interrupted run
+    picks up where it stopped.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        migrations: List[Migration] = MIGRATIONS,
+        batch_size: int = MIGRATION_BATCH_SIZE,
+        pause: float = MIGRATION_BATCH_PAUSE
+    ):
+        self.engine = engine
+        self.migrations = migrations
+        self.batch_size = max(1, batch_size)
+        self.pause = pause
+        self.is_postgresql = engine.dialect.name == "postgresql"
+        self._table = SchemaMigration.__table__
+
+    @contextmanager
+    def ddl(self):
+        """Transaction for schema changes that fails fast instead of blocking behind long queries"""
+        with self.engine.begin() as connection:
+            if self.is_postgresql:
+                # Transaction-local lock_timeout
+                connection.execute(text("SELECT set_config('lock_timeout', :timeout, true)"), {"timeout": MIGRATION_LOCK_TIMEOUT})
+            yield connection
+
+    def checkpoint(self, connection: Connection, migration: Migration, key: Optional[str], rows: int = 0):
+        """Record backfill progress inside the batch's own transaction"""
+        connection.execute(
+            self._table.update().where(self._table.c.version == migration.version).values(
+                checkpoint=key,
+                rows_backfilled=self._table.c.rows_backfilled + rows,
+                updated_at=datetime.utcnow()
+            )
+        )
+
+    def _state(self, migration: Migration):
+        with self.engine.begin() as connection:
+            state = connection.execute(self._table.select().where(self._table.c.version == migration.version)).first()
+            if state is None:
+                connection.execute(self._table.insert().values(
+                    version=migration.version,
+                    description=migration.description,
+                    step=0,
+                    rows_backfilled=0,
+                    started_at=datetime.utcnow(),
+                    updated_at=datetime.utcnow()
+                ))
+                state = connection.execute(self._table.select().where(self._table.c.version == migration.version)).first()
+        return state
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Every known migration with its recorded progress"""
+        self._table.create(self.engine, checkfirst=True)
+        with self.engine.connect() as connection:
+            states = {row.version: row for row in connection.execute(self._table.select())}
+        result = []
+        for migration in self.migrations:
+            state = states.get(migration.version)
+            result.append({
+                "version": migration.version,
+                "description": migration.description,
+                "status": "done" if state is not None and state.finished_at else "in progress" if state is not None else "pending",
+                "step": f"{state.step if state is not None else 0}/{len(migration.operations)}",
+                "rows_backfilled": state.rows_backfilled if state is not None else 0,
+                "finished_at": state.finished_at if state is not None else None
+            })
+        return result
+
+    def run(self, target: Optional[str] = None) -> List[str]:
+        """Apply pending migrations up to and including ``target``; returns the versions applied"""
+        self._table.create(self.engine, checkfirst=True)
+        applied = []
+        for migration in self.migrations:
+            if target is not None and migration.version > target:
+                break
+            state = self._state(migration)
+            if state.finished_at is not None:
+                continue
+
+            logger.info("Applying migration %s: %s", migration.version, migration.description)
+            step, checkpoint = state.step or 0, state.checkpoint
+            for index, operation in enumerate(migration.operations):
+                if index < step:
+                    continue
+                logger.info("  %s", operation)
+                operation.apply(self, migration, checkpoint)
+                checkpoint = None
+                with self.engine.begin() as connection:
+                    connection.execute(
+                        self._table.update().where(self._table.c.version == migration.version).values(
+                            step=index + 1, checkpoint=None, updated_at=datetime.utcnow()
+                        )
+                    )
+
+            with self.engine.begin() as connection:
+                connection.execute(
+                    self._table.update().where(self._table.c.version == migration.version).values(
+                        finished_at=datetime.utcnow()
+                    )
+                )
+            applied.append(migration.version)
+        return applied
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Integer, Text, DateTime
+from sqlalchemy import Column, String, Float, Integer, Text, DateTime, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from .database import Base
 import uuid
@@ -22,6 +22,9 @@ class Product(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
 
+# Exact, case-insensitive category lookups (see normalize_category in recommender.py)
+Index("ix_products_category_normalized", func.lower(func.trim(Product.category)))
+
 class ProductImage(Base):
     __tablename__ = "product_images"
     
@@ -32,3 +35,37 @@ class ProductImage(Base):
     product_id = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ModelVersion(Base):
+    __tablename__ = "recommender_model_versions"
+    
+    # One row per materialized model build; exactly one is active at a time
+    version = Column(String, primary_key=True)
+    is_active = Column(Integer, default=0, index=True)  # 0 = false, 1 = true
+    product_count = Column(Integer, default=0)
+    neighbors_per_product = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ProductNeighbor(Base):
+    __tablename__ = "product_neighbors"
+    
+    # Top-K recommendations of a product for one model version; read with
+    # WHERE model_version = <active version> AND product_id = ? ORDER BY rank
+    model_version = Column(String, primary_key=True)
+    product_id = Column(String, primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    neighbor_id = Column(String, nullable=False)
+    score = Column(Float, nullable=False)
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    
+    # Progress of one migration in app/migrations.py; finished_at is set once it is complete
+    version = Column(String, primary_key=True)
+    description = Column(String)
+    step = Column(Integer, default=0)  # operations completed
+    checkpoint = Column(String, nullable=True)  # last key backfilled by the current operation
+    rows_backfilled = Column(Integer, default=0)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,270 @@
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Time budget of one personalized request; stages that would start after it are skipped
+PIPELINE_BUDGET_MS = float(os.getenv("RECOMMENDER_PIPELINE_BUDGET_MS", "250"))
+
+# Contribution of each generator's normalized score to the final ranking. Content
+# similarity (boosted by interaction weight) dominates; the others break ties
+# and fill in when the content candidates run short.
+GENERATOR_WEIGHTS = {
+    "content": 1.0,
+    "cooccurrence": 0.1,
+    "popularity": 0.05,
+}
+
+# Seed interactions used for content and co-occurrence candidates
+PIPELINE_SEEDS = 5
+
+class Deadline:
+    """Monotonic deadline shared by the stages of one request"""
+
+    def __init__(self, budget_ms: float = PIPELINE_BUDGET_MS, started: Optional[float] = None):
+        self.budget_ms = budget_ms
+        self.started = time.monotonic() if started is None else started
+        self.expires = self.started + budget_ms / 1000
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires
+
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.started) * 1000
+
+class Candidates:
+    """Rows proposed by one generator, with scores (higher is better) and optional per-row seed info"""
+
+    def __init__(self, rows: np.ndarray, scores: np.ndarray, seeds: Optional[List[Optional[Dict[str, Any]]]] = None):
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.scores = np.asarray(scores, dtype=np.float64)
+        self.seeds = seeds
+
+    @classmethod
+    def empty(cls) -> "Candidates":
+        return cls(np.empty(0, dtype=np.int64), np.empty(0))
+
+class CandidateGenerator:
+    """
+    One source of candidate rows for a user's seed interactions.
+
+    ``model`` is the ModelSnapshot the request took, so every stage reads
+    the same model version.
+    """
+
+    name = None
+    # Cheap generators still run after the deadline when there are too few candidates
+    fallback = False
+
+    def generate(self, model, seeds: List[Dict[str, Any]], limit: int, mask: Optional[np.ndarray]) -> Optional[Candidates]:
+        """Candidates for ``seeds``, or None when the generator cannot run for this model"""
+        raise NotImplementedError
+
+class ContentNeighbors(CandidateGenerator):
+    """TF-IDF neighbours of the seeds, boosted by each seed's interaction weight"""
+
+    name = "content"
+
+    def generate(self, model, seeds, limit, mask):
+        seeds = seeds[:PIPELINE_SEEDS]
+        rows, scores, origins = [], [], []
+        for seed, result in zip(seeds, model._similar_indices_many([seed["id"] for seed in seeds], limit, mask)):
+            if result is None:
+                continue
+            similar_indices, similarity_scores = result
+            rows.append(similar_indices)
+            # Boost similarity score based on user interaction weight
+            scores.append(similarity_scores + (seed["interaction_weight"] or 1.0) * 0.1)
+            origins.extend([seed] * len(similar_indices))
+        if not rows:
+            return Candidates.empty()
+        return Candidates(np.concatenate(rows), np.concatenate(scores), origins)
+
+class CoOccurrenceIndex:
+    """
+    User x item interaction matrix of one model version, for CoOccurrence.
+
+    An item is a product_id (the catalogue product an interaction row refers
+    to), or the row id when there is none. Built by the recommender alongside
+    the rest of a model (see ConstructionProductRecommender._install), so
+    requests never build it themselves.
+    """
+
+    def __init__(self, version: str, matrix, item_codes: np.ndarray, user_codes: np.ndarray, first_rows: np.ndarray):
+        self.version = version
+        self.matrix = matrix
+        self.item_codes = item_codes
+        self.user_codes = user_codes
+        # First row of each item, used to report it
+        self.first_rows = first_rows
+
+    @classmethod
+    def build(cls, products_df, version: str) -> "CoOccurrenceIndex":
+        from scipy.sparse import csr_matrix
+        import pandas as pd
+
+        items = products_df['product_id'].where(products_df['product_id'].notna(), products_df['id'])
+        item_codes, item_names = pd.factorize(items)
+        user_codes, user_names = pd.factorize(products_df['user_id'])
+        interacted = user_codes >= 0
+        matrix = csr_matrix(
+            (np.ones(int(interacted.sum())), (user_codes[interacted], item_codes[interacted])),
+            shape=(len(user_names), len(item_names))
+        )
+        matrix.data[:] = 1  # Binary: repeated interactions count once
+        # Every code occurs, so the first index of each unique code is the item's first row
+        _, first_rows = np.unique(item_codes, return_index=True)
+        return cls(version, matrix.tocsr(), item_codes, user_codes, first_rows)
+
+class CoOccurrence(CandidateGenerator):
+    """
+    Products interacted with by other users who share items with the seeds.
+
+    Scores are the number of such users per item (see CoOccurrenceIndex),
+    normalized by the largest count. The seeds' own users are left out, so a
+    user's other interactions are not echoed back. Skipped while the model's
+    index is missing or belongs to another version.
+    """
+
+    name = "cooccurrence"
+
+    def generate(self, model, seeds, limit, mask):
+        index = model.cooccurrence_index
+        if index is None or index.version != model.version:
+            return None
+        item_codes, user_codes, matrix = index.item_codes, index.user_codes, index.matrix
+
+        seed_rows = [model.product_positions.get(seed["id"]) for seed in seeds[:PIPELINE_SEEDS]]
+        seed_rows = np.array([row for row in seed_rows if row is not None and row < len(item_codes)], dtype=np.int64)
+        if not len(seed_rows) or not matrix.shape[0]:
+            return Candidates.empty()
+        seed_items = np.unique(item_codes[seed_rows])
+
+        # Other users sharing a seed item, then how many of them touched each item
+        users = np.asarray(matrix[:, seed_items].sum(axis=1)).ravel() > 0
+        own_users = user_codes[seed_rows]
+        users[own_users[own_users >= 0]] = False
+        counts = np.asarray(matrix[users].sum(axis=0)).ravel()
+        counts[seed_items] = 0
+        if mask is not None:
+            counts[~mask[index.first_rows]] = 0
+        items = np.flatnonzero(counts)
+        if not len(items):
+            return Candidates.empty()
+        top = items[np.argsort(-counts[items], kind='stable')[:limit]]
+        return Candidates(index.first_rows[top], counts[top] / counts[top[0]])
+
+class Popularity(CandidateGenerator):
+    """Highest interaction weight overall (cached per model snapshot)"""
+
+    name = "popularity"
+    fallback = True
+
+    def generate(self, model, seeds, limit, mask):
+        rows, weights = model.popular_rows(limit, mask)
+        top = weights[0] if len(weights) and weights[0] > 0 else 1.0
+        return Candidates(rows, weights / top)
+
+class RecommendationPipeline:
+    """
+    Personalized recommendations in stages: candidate generation, scoring, filtering.
+
+    Generators run in order while the request's deadline allows; a generator
+    that would start after it is skipped, except cheap fallback generators
+    when fewer than ``top_n`` candidates were found. Scoring is one
+    vectorized pass: each row's score is the weighted sum of its best score
+    from every generator. A generator that cannot serve the model (e.g. its
+    index is out of date) is skipped as well. The filter stage drops the user's own interactions
+    and anything outside the request filters. Whatever was gathered by the
+    deadline is ranked and returned, with per-stage timings.
+
+    The deadline is only checked between stages. Each generator is one
+    vectorized pass and runs to completion once started, so a request can
+    overrun its budget by the duration of the stage in flight (reported as
+    ``deadline_exceeded``).
+    """
+
+    def __init__(self, generators: Optional[List[CandidateGenerator]] = None, weights: Dict[str, float] = GENERATOR_WEIGHTS):
+        self.generators = generators if generators is not None else [ContentNeighbors(), CoOccurrence(), Popularity()]
+        self.weights = weights
+
+    def run(
+        self,
+        model,
+        seeds: List[Dict[str, Any]],
+        top_n: int,
+        mask: Optional[np.ndarray] = None,
+        deadline: Optional[Deadline] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        deadline = deadline or Deadline()
+        timings = {}
+        skipped = []
+        generated = {}
+        # Each seed's own top_n, plus room for the user's interactions filtered out later
+        limit = top_n + min(len(seeds), PIPELINE_SEEDS)
+
+        for generator in self.generators:
+            found = sum(len(candidates.rows) for candidates in generated.values())
+            if deadline.expired and not (generator.fallback and found < top_n):
+                skipped.append(generator.name)
+                continue
+            started = time.monotonic()
+            candidates = generator.generate(model, seeds, limit, mask)
+            timings[generator.name] = (time.monotonic() - started) * 1000
+            if candidates is None:
+                skipped.append(generator.name)
+                continue
+            generated[generator.name] = candidates
+
+        started = time.monotonic()
+        rows, scores, origins = self._score(model, generated)
+        timings["scoring"] = (time.monotonic() - started) * 1000
+
+        started = time.monotonic()
+        keep = np.ones(len(rows), dtype=bool)
+        if mask is not None:
+            keep &= mask[rows]
+        seed_rows = [model.product_positions.get(seed["id"]) for seed in seeds]
+        keep &= ~np.isin(rows, [row for row in seed_rows if row is not None])
+        rows, scores, origins = rows[keep], scores[keep], [origin for origin, kept in zip(origins, keep) if kept]
+        order = np.argsort(-scores, kind='stable')[:top_n]
+        timings["filtering"] = (time.monotonic() - started) * 1000
+
+        recommendations = model._recommendation_records(rows[order], np.minimum(1.0, scores[order]))
+        for recommendation, i in zip(recommendations, order.tolist()):
+            if origins[i] is not None:
+                recommendation['interaction_weight'] = origins[i]["interaction_weight"]
+                recommendation['interaction_type'] = origins[i]["interaction_type"]
+
+        metadata = {
+            "budget_ms": deadline.budget_ms,
+            "elapsed_ms": deadline.elapsed_ms(),
+            "deadline_exceeded": deadline.expired,
+            "stages_ms": timings,
+            "skipped": skipped,
+            "candidates": {name: len(candidates.rows) for name, candidates in generated.items()}
+        }
+        return recommendations, metadata
+
+    def _score(self, model, generated: Dict[str, Candidates]):
+        """Weighted sum over generators of each row's best score, with the seed it came from"""
+        n_products = len(model.product_ids)
+        total = np.zeros(n_products)
+        proposed = np.zeros(n_products, dtype=bool)
+        origin_of = {}
+        for name, candidates in generated.items():
+            if not len(candidates.rows):
+                continue
+            best = np.zeros(n_products)
+            np.maximum.at(best, candidates.rows, candidates.scores)
+            total += self.weights.get(name, 0.0) * best
+            proposed[candidates.rows] = True
+            if candidates.seeds is not None:
+                # Credit each row to the seed behind its best score
+                for row, score, seed in zip(candidates.rows.tolist(), candidates.scores.tolist(), candidates.seeds):
+                    if score == best[row] and row not in origin_of:
+                        origin_of[row] = seed
+        rows = np.flatnonzero(proposed)
+        return rows, total[rows], [origin_of.get(row) for row in rows.tolist()]
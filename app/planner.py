@@ -0,0 +1,148 @@
+import logging
+import re
+import resource
+import sys
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Strategies from most to least accurate; the planner picks the first that fits
+STRATEGY_DENSE = "dense"  # full N x N cosine similarity matrix (exact)
+STRATEGY_TOPK = "topk"    # top-K neighbours per product, on-demand rows beyond K (exact for top_n <= K)
+STRATEGY_SVD = "svd"      # L2-normalized truncated-SVD embeddings (approximate)
+STRATEGY_SHARDED = "sharded"  # per-category matrices plus a global layer (only when set explicitly)
+STRATEGY_AUTO = "auto"    # let the planner choose from RECOMMENDER_MEMORY_BUDGET
+STRATEGIES_BY_ACCURACY = [STRATEGY_DENSE, STRATEGY_TOPK, STRATEGY_SVD]
+
+# Rough per-product cost of the DataFrame, response fragments and id lists
+PER_PRODUCT_OVERHEAD = 2048
+
+_UNITS = {"": 1, "b": 1, "k": 1024, "kb": 1024, "m": 1024 ** 2, "mb": 1024 ** 2, "g": 1024 ** 3, "gb": 1024 ** 3}
+
+def parse_memory(value: Optional[str]) -> Optional[int]:
+    """Parse sizes such as '512MB', '2g' or '1073741824' into bytes"""
+    if not value:
+        return None
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmg]?b?)\s*", value.lower())
+    if not match:
+        raise ValueError(f"Invalid memory size: {value!r}")
+    return int(float(match.group(1)) * _UNITS[match.group(2)])
+
+def estimate_memory(
+    strategy: str,
+    n_rows: int,
+    nnz: int,
+    neighbors: int,
+    block_size: int,
+    workers: int,
+    components: int
+) -> int:
+    """Estimated peak bytes to build and hold a model with the given strategy"""
+    # TF-IDF matrix (float64 data + int32 indices) and its term-major copy
+    base = 2 * nnz * 12 + n_rows * PER_PRODUCT_OVERHEAD
+
+    if strategy == STRATEGY_DENSE:
+        # cosine_similarity materializes the sparse product before densifying
+        return base + 2 * n_rows * n_rows * 8
+    if strategy == STRATEGY_TOPK:
+        # N x K int32 + float32 lists, plus one block x N product per worker
+        block_rows = min(block_size, n_rows)
+        return base + n_rows * neighbors * 8 + max(1, workers) * block_rows * n_rows * 12
+    if strategy == STRATEGY_SVD:
+        # float64 fit_transform output and randomized-SVD workspace, float32 result
+        return base + n_rows * components * (8 * 3 + 4)
+    raise ValueError(f"Unknown strategy: {strategy}")
+
+def plan_build(
+    n_rows: int,
+    nnz: int,
+    budget: Optional[int],
+    neighbors: int,
+    block_size: int,
+    workers: int,
+    components: int,
+    candidates: List[str] = STRATEGIES_BY_ACCURACY
+) -> Dict[str, Any]:
+    """
+    Pick the most accurate strategy whose estimated memory fits ``budget``.
+
+    Falls back to the smallest estimate when nothing fits. The returned plan
+    lists every estimate and the reason for the choice.
+    """
+    estimates = {
+        strategy: estimate_memory(strategy, n_rows, nnz, neighbors, block_size, workers, components)
+        for strategy in candidates
+    }
+    fitting = [strategy for strategy in candidates if budget is None or estimates[strategy] <= budget]
+    if fitting:
+        strategy = fitting[0]
+        reason = "most accurate strategy within the memory budget"
+    else:
+        strategy = min(candidates, key=lambda name: estimates[name])
+        reason = "no strategy fits the memory budget; using the smallest estimate"
+
+    return {
+        "strategy": strategy,
+        "reason": reason,
+        "budget_bytes": budget,
+        "products": n_rows,
+        "tfidf_nnz": nnz,
+        "estimated_bytes": estimates
+    }
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size over this process's whole lifetime"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def _proc_status_bytes(field: str) -> Optional[int]:
+    """A kB field of /proc/self/status (e.g. VmRSS) in bytes, or None without procfs"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+class BuildMemory:
+    """
+    Peak resident set size over one model build.
+
+    ru_maxrss never goes down, so after an earlier, larger build it says
+    nothing about the current one. On Linux start() resets the kernel's
+    high-water mark (writing 5 to /proc/self/clear_refs) and stop() reads it
+    back from VmHWM, which is the peak of this build alone; ``scope`` is then
+    "build". Memory allocated by other threads during the build is included,
+    and ru_maxrss restarts from the reset as well.
+    Without procfs ``scope`` is "process" and the peak is ru_maxrss.
+    """
+
+    def __init__(self):
+        self.scope = "process"
+        self.start_bytes = None
+        self.peak_bytes = None
+
+    def start(self) -> "BuildMemory":
+        self.start_bytes = _proc_status_bytes("VmRSS")
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+            self.scope = "build"
+        except OSError:
+            self.scope = "process"
+        return self
+
+    def stop(self) -> int:
+        peak = _proc_status_bytes("VmHWM") if self.scope == "build" else None
+        self.peak_bytes = peak if peak is not None else peak_rss_bytes()
+        return self.peak_bytes
+
+    @property
+    def growth_bytes(self) -> Optional[int]:
+        """How far the peak rose above RSS at start()"""
+        if self.start_bytes is None or self.peak_bytes is None:
+            return None
+        return max(0, self.peak_bytes - self.start_bytes)
@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Users whose profiles are kept in memory (least recently used are evicted)
+PROFILE_CACHE_SIZE = int(os.getenv("RECOMMENDER_PROFILE_CACHE_SIZE", "10000"))
+
+# Seconds a cached profile is trusted; bounds how long rows changed or deleted
+# outside this service and the sync loop's view (see app/sync.py) go unseen
+PROFILE_TTL = float(os.getenv("RECOMMENDER_PROFILE_TTL", "300"))
+
+# Interactions per profile, matching the personalized query's LIMIT
+PROFILE_INTERACTIONS = 20
+
+def interaction_seed(product) -> Dict[str, Any]:
+    """Profile entry for one of a user's Product rows"""
+    return {
+        "id": product.id,
+        "interaction_weight": product.interaction_weight,
+        "interaction_type": product.interaction_type,
+        "created_at": product.created_at
+    }
+
+def _seed_order(seed: Dict[str, Any]):
+    # Sorted in reverse: interaction_weight DESC, created_at DESC like the database query
+    return (seed["interaction_weight"] or 0.0, seed["created_at"] or datetime.min)
+
+class UserProfileCache:
+    """
+    Bounded LRU cache of each user's strongest interactions.
+
+    A profile is the list the personalized endpoint would otherwise query
+    from the database: the user's top interactions by weight, then recency.
+    Interactions written through the API or picked up by the sync loop are
+    merged into their user's cached profile in place; a deleted one drops
+    that user's profile. Other users' profiles are unaffected by writes and
+    by model rebuilds, and every profile expires after ``ttl`` seconds.
+
+    A read from the database races with writes for the same user, so it is
+    cached only if no write for that user was recorded since the read
+    started (see token()).
+    """
+
+    def __init__(self, max_size: int = PROFILE_CACHE_SIZE, interactions: int = PROFILE_INTERACTIONS, ttl: float = PROFILE_TTL):
+        self.max_size = max_size
+        self.interactions = interactions
+        self.ttl = ttl
+        self._profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Sequence number of the latest write per user (bounded like the profiles);
+        # writes older than the evicted ones are summarized by _evicted_write
+        self._sequence = 0
+        self._writes: "OrderedDict[str, int]" = OrderedDict()
+        self._evicted_write = 0
+        self.hits = 0
+        self.misses = 0
+        self.updates = 0
+        self.evictions = 0
+
+    def token(self) -> int:
+        """Take before reading a profile from the database; pass it to put()"""
+        with self._lock:
+            return self._sequence
+
+    def get(self, user_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Cached interactions of a user, or None on a miss"""
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is None or time.monotonic() - profile["cached_at"] >= self.ttl:
+                if profile is not None:
+                    del self._profiles[user_id]
+                self.misses += 1
+                return None
+            self._profiles.move_to_end(user_id)
+            self.hits += 1
+            return profile["seeds"]
+
+    def put(self, user_id: str, seeds: List[Dict[str, Any]], token: int):
+        """Cache the interactions read from the database after token() returned ``token``"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if self._writes.get(user_id, self._evicted_write) > token:
+                # The user wrote while the profile was being read; it may be stale
+                return
+            self._profiles[user_id] = {"seeds": list(seeds[:self.interactions]), "cached_at": time.monotonic()}
+            self._profiles.move_to_end(user_id)
+            while len(self._profiles) > self.max_size:
+                self._profiles.popitem(last=False)
+                self.evictions += 1
+
+    def _record_write(self, user_id: str):
+        # Caller holds the lock
+        self._sequence += 1
+        self._writes[user_id] = self._sequence
+        self._writes.move_to_end(user_id)
+        while len(self._writes) > max(self.max_size, 1):
+            _, sequence = self._writes.popitem(last=False)
+            self._evicted_write = max(self._evicted_write, sequence)
+
+    def add_interaction(self, product):
+        """Merge a newly written or changed interaction into its user's cached profile, if any"""
+        if not product.user_id:
+            return
+        with self._lock:
+            self._record_write(product.user_id)
+            profile = self._profiles.get(product.user_id)
+            if profile is None:
+                return
+            seeds = [seed for seed in profile["seeds"] if seed["id"] != product.id]
+            seeds.append(interaction_seed(product))
+            seeds.sort(key=_seed_order, reverse=True)
+            # Copy-on-write: requests holding the old list keep a consistent view
+            profile["seeds"] = seeds[:self.interactions]
+            self.updates += 1
+
+    def add_interactions(self, products):
+        """add_interaction for each of ``products`` (e.g. a batch applied by the sync loop)"""
+        for product in products:
+            self.add_interaction(product)
+
+    def invalidate(self, user_id: Optional[str]):
+        if not user_id:
+            return
+        with self._lock:
+            self._record_write(user_id)
+            self._profiles.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._profiles),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "updates": self.updates,
+                "evictions": self.evictions
+            }
@@ -1,18 +1,102 @@
-import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import orjson
 from sqlalchemy.orm import Session
-from .models import Product
-from typing import List, Dict, Any
+from .models import Product, ProductImage
+from .similarity import top_k_neighbors, rows_top_k, merge_changed_neighbors, DEFAULT_NEIGHBORS, DEFAULT_BLOCK_SIZE
+from .hashing import HashingTfidfVectorizer, DEFAULT_HASH_FEATURES
+from .sharding import ShardIndex, DEFAULT_GLOBAL_ITEMS
+from .pipeline import CoOccurrenceIndex, RecommendationPipeline, Deadline
+from .planner import STRATEGY_DENSE, STRATEGY_TOPK, STRATEGY_SVD, STRATEGY_SHARDED, STRATEGY_AUTO, plan_build, parse_memory, BuildMemory
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime
+import copy
+import hashlib
+import logging
+import os
 import re
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# pandas and scikit-learn are imported inside fit()/load() so that importing
+# this module (and therefore app.main) stays cheap at process start.
+
+# Model lifecycle states reported by /ready
+STATUS_EMPTY = "empty"
+STATUS_LOADING = "loading"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+def normalize_category(category: Optional[str]) -> str:
+    """Canonical form of a category name used for exact category lookups"""
+    # Must stay in sync with the lower(trim(category)) index on products
+    return (category or "").strip().lower()
+
+# How product-to-product similarity is materialized at fit time is one of
+# the STRATEGY_* values in app/planner.py
+
+# How product text becomes TF-IDF vectors
+VECTORIZER_VOCABULARY = "tfidf"  # fitted vocabulary of the 1000 most frequent terms
+VECTORIZER_HASHING = "hashing"   # hashed terms with incrementally updated IDF (app/hashing.py)
+
+# Embedding size of the reduced-dimension (svd) strategy
+DEFAULT_SVD_COMPONENTS = 128
+
+# Bump whenever _extract_construction_features changes its output, so texts
+# cached by an older version are not reused
+FEATURE_EXTRACTOR_VERSION = 1
+
+# Normalized-price tier boundaries (budget, economy, mid, premium, luxury)
+PRICE_TIER_EDGES = [-np.inf, 0.2, 0.4, 0.6, 0.8, np.inf]
 
 class ConstructionProductRecommender:
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
-        self.similarity_matrix = None
-        self.products_df = None
-        self.product_ids = None
+    def __init__(
+        self,
+        strategy: Optional[str] = None,
+        neighbors: Optional[int] = None,
+        workers: Optional[int] = None,
+        block_size: Optional[int] = None,
+        memory_budget: Optional[int] = None,
+        svd_components: Optional[int] = None,
+        vectorizer: Optional[str] = None
+    ):
+        self.memory_budget = memory_budget or parse_memory(os.getenv("RECOMMENDER_MEMORY_BUDGET"))
+        # With a memory budget the planner picks the strategy unless one is forced
+        default_strategy = STRATEGY_AUTO if self.memory_budget else STRATEGY_DENSE
+        self.strategy = strategy or os.getenv("RECOMMENDER_STRATEGY", default_strategy)
+        self.neighbors = neighbors or int(os.getenv("RECOMMENDER_NEIGHBORS", DEFAULT_NEIGHBORS))
+        self.workers = workers or int(os.getenv("RECOMMENDER_WORKERS", "1"))
+        self.block_size = block_size or int(os.getenv("RECOMMENDER_BLOCK_SIZE", DEFAULT_BLOCK_SIZE))
+        self.vectorizer_mode = vectorizer or os.getenv("RECOMMENDER_VECTORIZER", VECTORIZER_VOCABULARY)
+        self.hash_features = int(os.getenv("RECOMMENDER_HASH_FEATURES", DEFAULT_HASH_FEATURES))
+        self.global_items = int(os.getenv("RECOMMENDER_GLOBAL_ITEMS", DEFAULT_GLOBAL_ITEMS))
+        self.svd_components = svd_components or int(os.getenv("RECOMMENDER_SVD_COMPONENTS", DEFAULT_SVD_COMPONENTS))
+        
+        # Serving state of the current model version, replaced as a whole (see ModelSnapshot)
+        self.snapshot = ModelSnapshot()
+        
+        # Extracted feature text by content hash, reused across refits and saved with the model
+        self.feature_cache = {}
+        # Rows featurized by the last build_feature_texts call, and how many needed extraction
+        self.last_featurization = None
+        
+        # Candidate generation and re-ranking for personalized recommendations
+        self.pipeline = RecommendationPipeline()
+        
+        # Newest (updated_at, id) reflected in the model; see app/sync.py
+        self.watermark = None
+        # Same for product_images, whose default images are baked into the model
+        self.image_watermark = None
+        
+        # Lifecycle bookkeeping
+        self.status = STATUS_EMPTY
+        self.error = None
+        self.fitted_at = None
+        self._fit_lock = threading.Lock()
+        
+        # Strategy decision, memory estimates and measured peak RSS of the last fit
+        self.build_plan = None
         
         # Construction-specific categories for better recommendations
         self.construction_categories = {
@@ -52,16 +136,93 @@ class ConstructionProductRecommender:
         
         return text
     
+    @property
+    def is_ready(self) -> bool:
+        """True once a model has been fitted or loaded and can serve queries"""
+        return self.status == STATUS_READY
+    
+    @property
+    def version(self) -> Optional[str]:
+        """Version of the current snapshot; changes on every fit or incremental update"""
+        return self.snapshot.version
+    
+    def status_info(self) -> Dict[str, Any]:
+        """Describe the current model state for the readiness probe"""
+        snapshot = self.snapshot
+        return {
+            "status": self.status,
+            "version": snapshot.version,
+            "products": len(snapshot.product_ids) if snapshot.product_ids is not None else 0,
+            "fitted_at": self.fitted_at.isoformat() + "Z" if self.fitted_at else None,
+            "error": self.error,
+            "build_plan": self.build_plan
+        }
+    
     def fit(self, db: Session):
         """Fit the recommendation model with construction products from database"""
+        with self._fit_lock:
+            if not self.is_ready:
+                self.status = STATUS_LOADING
+            try:
+                self._fit(db)
+            except Exception as e:
+                if not self.is_ready:
+                    self.status = STATUS_FAILED
+                self.error = str(e)
+                raise
+            self.status = STATUS_READY
+            self.error = None
+            self.fitted_at = datetime.utcnow()
+    
+    def _fit(self, db: Session):
         # Fetch all products from database
         products = db.query(Product).all()
         
         if not products:
+            self._install(None, None, None, None)
+            self.watermark = None
+            self.image_watermark = None
             return
         
-        # Convert to DataFrame
-        self.products_df = pd.DataFrame([
+        # Read the image watermark first so images changed during the fit are polled again
+        image_watermark = db.query(ProductImage.updated_at, ProductImage.id).filter(
+            ProductImage.updated_at.isnot(None)
+        ).order_by(ProductImage.updated_at.desc(), ProductImage.id.desc()).first()
+        images = self.default_images_of(db)
+        
+        self.fit_frame(self.products_to_frame(products, images))
+        self.watermark = self.watermark_of(products)
+        self.image_watermark = tuple(image_watermark) if image_watermark else None
+    
+    @staticmethod
+    def default_images_of(db: Session, product_ids: Optional[List[str]] = None) -> Dict[str, Tuple[str, Optional[str]]]:
+        """(url, alt) of the default image of each product, in one query"""
+        query = db.query(ProductImage.product_id, ProductImage.url, ProductImage.alt).filter(ProductImage.is_default == 1)
+        if product_ids is not None:
+            if not product_ids:
+                return {}
+            query = query.filter(ProductImage.product_id.in_(product_ids))
+        # With several default images the most recently updated one wins
+        return {
+            product_id: (url, alt)
+            for product_id, url, alt in query.order_by(ProductImage.updated_at, ProductImage.id)
+        }
+    
+    @staticmethod
+    def watermark_of(products, current: Optional[Tuple[datetime, str]] = None) -> Optional[Tuple[datetime, str]]:
+        """Largest (updated_at, id) among ``products`` and ``current``"""
+        marks = [(product.updated_at, product.id) for product in products if product.updated_at is not None]
+        if current is not None:
+            marks.append(current)
+        return max(marks) if marks else None
+    
+    @staticmethod
+    def products_to_frame(products, images: Optional[Dict[str, Tuple[str, Optional[str]]]] = None):
+        """Convert Product rows (and their default images, see default_images_of) into the model's DataFrame"""
+        import pandas as pd
+        
+        images = images or {}
+        return pd.DataFrame([
             {
                 'id': product.id,
                 'product_id': product.product_id,
@@ -72,87 +233,972 @@ class ConstructionProductRecommender:
                 'stock': product.stock,
                 'user_id': product.user_id,
                 'interaction_weight': product.interaction_weight or 1.0,
-                'interaction_type': product.interaction_type or 'view'
+                'interaction_type': product.interaction_type or 'view',
+                'image_url': images.get(product.id, (None, None))[0],
+                'image_alt': images.get(product.id, (None, None))[1]
             }
             for product in products
         ])
+    
+    @staticmethod
+    def _feature_key(name: str, description: str, category: str) -> str:
+        """Content hash identifying the extracted features of one product"""
+        content = f"{FEATURE_EXTRACTOR_VERSION}\0{name}\0{description}\0{category}"
+        return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+    
+    def build_feature_texts(
+        self,
+        products_df,
+        price_bounds: Optional[Tuple[float, float]] = None,
+        prune_cache: bool = False
+    ) -> List[str]:
+        """
+        Build the enhanced feature text of every product, in row order.
+
+        Price tiers are relative to ``price_bounds`` (min, max); by default the
+        bounds of ``products_df`` itself. The keyword and regex extraction is
+        only run for products whose text is not in feature_cache yet. With
+        ``prune_cache`` (full fits), entries for products no longer in
+        ``products_df`` are dropped afterwards.
+        """
+        import pandas as pd
         
         # Create enhanced feature vectors for construction products
+        cache = self.feature_cache
+        used = {}
         features = []
-        for _, product in self.products_df.iterrows():
-            feature_text = self._extract_construction_features(
-                product['name'], 
-                product['description'], 
-                product['category']
-            )
+        extracted = 0
+        for name, description, category in zip(products_df['name'], products_df['description'], products_df['category']):
+            key = self._feature_key(name, description, category)
+            feature_text = cache.get(key)
+            if feature_text is None:
+                feature_text = self._extract_construction_features(name, description, category)
+                cache[key] = feature_text
+                extracted += 1
+            used[key] = feature_text
             features.append(feature_text)
+        self.last_featurization = {"rows": len(features), "extracted": extracted}
+        if prune_cache:
+            self.feature_cache = used
         
         # Normalize price for better similarity calculation
-        max_price = self.products_df['price'].max()
-        min_price = self.products_df['price'].min()
+        min_price, max_price = price_bounds or self.price_bounds_of(products_df)
         price_range = max_price - min_price if max_price != min_price else 1
-        normalized_price = (self.products_df['price'] - min_price) / price_range
+        normalized_price = (products_df['price'] - min_price) / price_range
         
-        # Add price tier information
-        price_tier = pd.cut(normalized_price, bins=5, labels=['budget', 'economy', 'mid', 'premium', 'luxury'])
+        # Add price tier information (open-ended outer tiers so prices outside
+        # the bounds, e.g. from incremental updates, still get a tier)
+        price_tier = pd.cut(normalized_price, bins=PRICE_TIER_EDGES, labels=['budget', 'economy', 'mid', 'premium', 'luxury'])
         
         # Add interaction weight and type to features
         enhanced_features = []
-        for i, feature in enumerate(features):
-            product = self.products_df.iloc[i]
+        for feature, tier, interaction_weight, interaction_type in zip(
+            features, price_tier, products_df['interaction_weight'], products_df['interaction_type']
+        ):
             # Add interaction weight as a feature
-            weight_tier = 'low' if product['interaction_weight'] < 3 else 'medium' if product['interaction_weight'] < 7 else 'high'
+            weight_tier = 'low' if interaction_weight < 3 else 'medium' if interaction_weight < 7 else 'high'
             # Add interaction type
-            interaction_type = product['interaction_type'] or 'view'
+            interaction_type = interaction_type or 'view'
             
-            enhanced_feature = f"{feature} {price_tier.iloc[i]} {weight_tier} {interaction_type}"
+            enhanced_feature = f"{feature} {tier} {weight_tier} {interaction_type}"
             enhanced_features.append(enhanced_feature)
         
+        return enhanced_features
+    
+    @staticmethod
+    def price_bounds_of(products_df) -> Tuple[float, float]:
+        return float(products_df['price'].min()), float(products_df['price'].max())
+    
+    def vectorize(self, products_df):
+        """Fit a TF-IDF vectorizer on the products; returns (vectorizer, tfidf_matrix)"""
+        texts = self.build_feature_texts(products_df, prune_cache=True)
+        
+        if self.vectorizer_mode == VECTORIZER_HASHING:
+            # No vocabulary pass: chunks are hashed independently across workers
+            vectorizer = HashingTfidfVectorizer(self.hash_features)
+            return vectorizer, vectorizer.fit_transform(texts, workers=self.workers)
+        if self.vectorizer_mode != VECTORIZER_VOCABULARY:
+            raise ValueError(f"Unknown recommender vectorizer: {self.vectorizer_mode}")
+        
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        
         # Create TF-IDF vectors
-        tfidf_matrix = self.vectorizer.fit_transform(enhanced_features)
+        vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
+        tfidf_matrix = vectorizer.fit_transform(texts)
+        return vectorizer, tfidf_matrix
+    
+    def plan(self, n_rows: int, nnz: int) -> Dict[str, Any]:
+        """Decide how to build a model of ``n_rows`` products (see app/planner.py)"""
+        plan = plan_build(
+            n_rows,
+            nnz,
+            self.memory_budget,
+            neighbors=self.neighbors,
+            block_size=self.block_size,
+            workers=self.workers,
+            components=self.svd_components
+        )
+        if self.strategy != STRATEGY_AUTO:
+            plan["strategy"] = self.strategy
+            plan["reason"] = "strategy set by RECOMMENDER_STRATEGY"
+        return plan
+    
+    def fit_frame(self, products_df):
+        """Build the model from a products DataFrame (see products_to_frame)"""
+        memory = BuildMemory().start()
+        vectorizer, tfidf_matrix = self.vectorize(products_df)
+        plan = self.plan(tfidf_matrix.shape[0], tfidf_matrix.nnz)
+        plan["vectorizer"] = self.vectorizer_mode
+        plan["featurization"] = self.last_featurization
+        strategy = plan["strategy"]
+        
+        if strategy == STRATEGY_SVD:
+            from sklearn.decomposition import TruncatedSVD
+            
+            # Approximate: cosine similarity of low-rank embeddings, computed per query
+            components = min(self.svd_components, min(tfidf_matrix.shape) - 1)
+            if components < 1:
+                strategy = plan["strategy"] = STRATEGY_TOPK
+            else:
+                reducer = TruncatedSVD(n_components=components, random_state=42)
+                embeddings = self._normalize_rows(reducer.fit_transform(tfidf_matrix))
+                self._install(vectorizer, products_df, tfidf_matrix, None, reducer=reducer, embeddings=embeddings)
+        
+        if strategy == STRATEGY_TOPK:
+            # Only the top neighbours of each product are kept; rows outside
+            # them are scored on demand from the TF-IDF matrix
+            neighbor_index = top_k_neighbors(
+                tfidf_matrix,
+                k=self.neighbors,
+                block_size=self.block_size,
+                workers=self.workers
+            )
+            self._install(vectorizer, products_df, tfidf_matrix, None, neighbor_index)
+        elif strategy == STRATEGY_SHARDED:
+            # One similarity matrix per category plus a global layer of popular products
+            shard_index = ShardIndex.build(
+                tfidf_matrix,
+                self._categories_of(products_df),
+                self._popularity_of(products_df),
+                global_items=self.global_items,
+                workers=self.workers
+            )
+            plan["estimated_bytes"][STRATEGY_SHARDED] = shard_index.memory_bytes()
+            plan["shards"] = len(shard_index.members)
+            self._install(vectorizer, products_df, tfidf_matrix, None, shard_index=shard_index)
+        elif strategy == STRATEGY_DENSE:
+            from sklearn.metrics.pairwise import cosine_similarity
+            
+            # Calculate cosine similarity matrix
+            similarity_matrix = cosine_similarity(tfidf_matrix)
+            self._install(vectorizer, products_df, tfidf_matrix, similarity_matrix)
+        elif strategy != STRATEGY_SVD:
+            raise ValueError(f"Unknown recommender strategy: {strategy}")
         
-        # Calculate cosine similarity matrix
-        self.similarity_matrix = cosine_similarity(tfidf_matrix)
-        self.product_ids = self.products_df['id'].tolist()
+        plan["peak_rss_bytes"] = memory.stop()
+        plan["peak_rss_scope"] = memory.scope
+        plan["rss_growth_bytes"] = memory.growth_bytes
+        self.build_plan = plan
+        logger.info(
+            "Built %s model for %d products (%s); estimated %d bytes, peak RSS %d bytes (%s, grew by %s), budget %s",
+            strategy,
+            plan["products"],
+            plan["reason"],
+            plan["estimated_bytes"].get(strategy, 0),
+            plan["peak_rss_bytes"],
+            plan["peak_rss_scope"],
+            plan["rss_growth_bytes"],
+            plan["budget_bytes"]
+        )
     
-    def get_recommendations(self, product_id: str, top_n: int = 5) -> List[Dict[str, Any]]:
-        """Get top N similar construction products for a given product ID"""
-        if self.similarity_matrix is None or self.product_ids is None:
-            return []
+    @staticmethod
+    def _categories_of(products_df) -> List[str]:
+        """Shard key of every row"""
+        return [normalize_category(category) for category in products_df['category']]
+    
+    @staticmethod
+    def _popularity_of(products_df) -> np.ndarray:
+        """Ranking of products for the sharded strategy's global layer"""
+        return products_df['interaction_weight'].fillna(0).to_numpy(dtype=np.float64)
+    
+    @staticmethod
+    def _normalize_rows(embeddings) -> np.ndarray:
+        """L2-normalize embedding rows (as float32) so dot products are cosine similarities"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return embeddings / norms
+    
+    def _install(
+        self,
+        vectorizer,
+        products_df,
+        tfidf_matrix,
+        similarity_matrix,
+        neighbor_index=None,
+        response_fragments=None,
+        price_bounds=None,
+        version=None,
+        reducer=None,
+        embeddings=None,
+        shard_index=None
+    ):
+        """Derive the serving structures for a model and publish them as one snapshot"""
+        # Everything is built before the single assignment at the end, so
+        # concurrent readers see either the old snapshot or the new one
+        if response_fragments is None:
+            response_fragments = self._build_response_fragments(products_df)
+        if price_bounds is None and products_df is not None:
+            price_bounds = self.price_bounds_of(products_df)
+        # Term-major copy of the TF-IDF matrix: row t is the postings list of
+        # vocabulary term t, i.e. an inverted index with TF-IDF weights
+        term_index = tfidf_matrix.T.tocsr() if tfidf_matrix is not None else None
+        filter_arrays = self._build_filter_arrays(products_df)
+        product_ids = products_df['id'].tolist() if products_df is not None else []
+        product_positions = {product_id: i for i, product_id in enumerate(product_ids)}
+        version = version or uuid.uuid4().hex
+        cooccurrence_index = CoOccurrenceIndex.build(products_df, version) if products_df is not None else None
+        
+        self.snapshot = ModelSnapshot(
+            vectorizer=vectorizer,
+            products_df=products_df,
+            tfidf_matrix=tfidf_matrix,
+            term_index=term_index,
+            similarity_matrix=similarity_matrix,
+            neighbor_index=neighbor_index,
+            reducer=reducer,
+            embeddings=embeddings,
+            shard_index=shard_index,
+            response_fragments=response_fragments,
+            filter_arrays=filter_arrays,
+            price_bounds=price_bounds,
+            cooccurrence_index=cooccurrence_index,
+            version=version,
+            product_ids=product_ids,
+            product_positions=product_positions
+        )
+    
+    def has_product(self, product_id: str) -> bool:
+        """True if the product is part of the current model snapshot"""
+        return self.snapshot.has_product(product_id)
+    
+    def apply_changes(
+        self,
+        products,
+        advance_watermark: bool = True,
+        images: Optional[Dict[str, Tuple[str, Optional[str]]]] = None
+    ) -> bool:
+        """
+        Fold new or changed Product rows into the fitted model without a full fit.
+
+        Only the changed rows are featurized and only their similarity
+        rows/columns or neighbour lists are recomputed. With the vocabulary
+        vectorizer, terms it has never seen are ignored until the next full
+        fit; the hashing vectorizer keeps every term and updates its document
+        frequencies (other rows keep their IDF weights until the next fit). Returns
+        False when there is no fitted model to update, in which case the
+        caller should run fit() instead.
         
-        try:
-            # Find the index of the product
-            product_index = self.product_ids.index(product_id)
+        Pass ``advance_watermark=False`` when folding in rows out of order
+        (e.g. one product on demand), so the sync loop still visits any
+        older changes it has not seen yet. ``images`` are the default images
+        of ``products`` (see default_images_of); without it, products already
+        in the model keep their current image.
+        """
+        import pandas as pd
+        from scipy.sparse import vstack
+        
+        if not products:
+            return True
+        
+        with self._fit_lock:
+            model = self.snapshot
+            if not self.is_ready or model.vectorizer is None or model.products_df is None:
+                return False
             
-            # Get similarity scores for this product
-            similarity_scores = self.similarity_matrix[product_index]
+            if images is None:
+                images = model.current_images([product.id for product in products])
+            changes_df = self.products_to_frame(products, images)
+            n_old = len(model.product_ids)
+            positions = dict(model.product_positions)
             
-            # Get indices of most similar products (excluding the product itself)
-            similar_indices = np.argsort(similarity_scores)[::-1][1:top_n+1]
+            # selector[i] is the row of vstack([old, changes]) that becomes row i
+            selector = np.arange(n_old)
+            appended = []
+            for j, product_id in enumerate(changes_df['id']):
+                if product_id in positions:
+                    selector[positions[product_id]] = n_old + j
+                else:
+                    positions[product_id] = n_old + len(appended)
+                    appended.append(n_old + j)
+            selector = np.concatenate([selector, np.array(appended, dtype=np.int64)])
+            changed = np.array(sorted({positions[product_id] for product_id in changes_df['id']}), dtype=np.int64)
             
-            # Get product details for recommendations
-            recommendations = []
-            for idx in similar_indices:
-                if idx < len(self.products_df):
-                    product = self.products_df.iloc[idx]
-                    recommendations.append({
-                        'id': str(product['id']),
-                        'product_id': str(product['product_id']),
-                        'name': product['name'],
-                        'description': product['description'],
-                        'category': product['category'],
-                        'price': float(product['price']),
-                        'stock': int(product['stock']),
-                        'user_id': product['user_id'],
-                        'interaction_weight': float(product['interaction_weight']),
-                        'interaction_type': product['interaction_type'],
-                        'similarity_score': float(similarity_scores[idx])
-                    })
+            texts = self.build_feature_texts(changes_df, model.price_bounds)
+            if isinstance(model.vectorizer, HashingTfidfVectorizer):
+                replaced = [model.product_positions[product_id] for product_id in changes_df['id'] if product_id in model.product_positions]
+                vectorizer, change_rows = model.vectorizer.updated(texts, removed=model.tfidf_matrix[replaced])
+            else:
+                vectorizer, change_rows = model.vectorizer, model.vectorizer.transform(texts)
+            tfidf_matrix = vstack([model.tfidf_matrix, change_rows]).tocsr()[selector]
+            products_df = pd.concat([model.products_df, changes_df], ignore_index=True).iloc[selector].reset_index(drop=True)
+            fragments = model.response_fragments + self._build_response_fragments(changes_df)
+            response_fragments = [fragments[i] for i in selector]
+            n_new = len(selector)
             
-            return recommendations
+            similarity_matrix = None
+            neighbor_index = None
+            embeddings = None
+            shard_index = None
+            if model.similarity_matrix is not None:
+                similarity_matrix = model.similarity_matrix
+                if n_new > n_old:
+                    similarity_matrix = np.zeros((n_new, n_new), dtype=model.similarity_matrix.dtype)
+                    similarity_matrix[:n_old, :n_old] = model.similarity_matrix
+                else:
+                    similarity_matrix = similarity_matrix.copy()
+                columns = (tfidf_matrix @ tfidf_matrix[changed].T).toarray()
+                similarity_matrix[:, changed] = columns
+                similarity_matrix[changed, :] = columns.T
+            elif model.neighbor_index is not None:
+                old_indices, old_scores = model.neighbor_index
+                k = old_indices.shape[1]
+                indices = np.full((n_new, k), -1, dtype=old_indices.dtype)
+                scores = np.zeros((n_new, k), dtype=old_scores.dtype)
+                indices[:n_old], scores[:n_old] = old_indices, old_scores
+                merge_changed_neighbors(indices, scores, tfidf_matrix, changed)
+                indices[changed], scores[changed] = rows_top_k(tfidf_matrix, changed, k)
+                neighbor_index = (indices, scores)
+            elif model.embeddings is not None:
+                embeddings = np.zeros((n_new, model.embeddings.shape[1]), dtype=model.embeddings.dtype)
+                embeddings[:n_old] = model.embeddings
+                embeddings[changed] = self._normalize_rows(model.reducer.transform(tfidf_matrix[changed]))
+            elif model.shard_index is not None:
+                # Only the shards of changed rows (old and new category) are recomputed
+                shard_index = ShardIndex.build(
+                    tfidf_matrix,
+                    self._categories_of(products_df),
+                    self._popularity_of(products_df),
+                    global_items=self.global_items,
+                    previous=model.shard_index,
+                    previous_categories=self._categories_of(model.products_df),
+                    changed=changed.tolist()
+                )
             
-        except (ValueError, IndexError):
+            self._install(
+                vectorizer,
+                products_df,
+                tfidf_matrix,
+                similarity_matrix,
+                neighbor_index,
+                response_fragments=response_fragments,
+                price_bounds=model.price_bounds,
+                reducer=model.reducer,
+                embeddings=embeddings,
+                shard_index=shard_index
+            )
+            if advance_watermark:
+                self.watermark = self.watermark_of(products, self.watermark)
+        return True
+    
+    def apply_image_changes(
+        self,
+        images: Dict[str, Tuple[str, Optional[str]]],
+        product_ids: List[str],
+        watermark: Optional[Tuple[datetime, str]] = None
+    ) -> int:
+        """
+        Replace the default image of ``product_ids`` with their entry in ``images`` (or none).
+
+        Only the affected response fragments are re-encoded, and the model
+        keeps its version. Products that are not in the model are ignored.
+        Returns the number updated.
+        """
+        with self._fit_lock:
+            if not self.is_ready:
+                return 0
+            model = self.snapshot
+            positions = sorted({model.product_positions[product_id] for product_id in product_ids if product_id in model.product_positions})
+            if positions:
+                # Shallow copy: only the two image columns are replaced
+                products_df = model.products_df.copy(deep=False)
+                columns = {}
+                for column in ('image_url', 'image_alt'):
+                    if column in products_df:
+                        columns[column] = products_df[column].to_numpy(dtype=object, copy=True)
+                    else:
+                        columns[column] = np.full(len(products_df), None, dtype=object)
+                for position in positions:
+                    columns['image_url'][position], columns['image_alt'][position] = images.get(model.product_ids[position], (None, None))
+                for column, values in columns.items():
+                    products_df[column] = values
+                
+                response_fragments = list(model.response_fragments)
+                for position, fragment in zip(positions, self._build_response_fragments(products_df.iloc[positions])):
+                    response_fragments[position] = fragment
+                
+                # Images are not part of similarity, filters or co-occurrence, so the
+                # version and everything derived from it stay; profiles cached under
+                # it stay valid and the materialized neighbours are not rewritten
+                self.snapshot = model.replace(products_df=products_df, response_fragments=response_fragments)
+            if watermark is not None:
+                self.image_watermark = watermark
+        return len(positions)
+    
+    def save(self, path: str):
+        """Persist the fitted model to disk so the next start can skip fit"""
+        import joblib
+        
+        if not self.is_ready:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        model = self.snapshot
+        joblib.dump({
+            "vectorizer": model.vectorizer,
+            "products_df": model.products_df,
+            "tfidf_matrix": model.tfidf_matrix,
+            "similarity_matrix": model.similarity_matrix,
+            "neighbor_index": model.neighbor_index,
+            "reducer": model.reducer,
+            "embeddings": model.embeddings,
+            "shard_index": model.shard_index,
+            "build_plan": self.build_plan,
+            "feature_cache": self.feature_cache,
+            "product_ids": model.product_ids,
+            "price_bounds": model.price_bounds,
+            "watermark": self.watermark,
+            "image_watermark": self.image_watermark,
+            "version": model.version,
+            "fitted_at": self.fitted_at
+        }, tmp_path)
+        os.replace(tmp_path, path)
+    
+    def load(self, path: Optional[str]) -> bool:
+        """Load a model saved with save(); returns False if there is nothing to load"""
+        import joblib
+        
+        if not path or not os.path.exists(path):
+            return False
+        with self._fit_lock:
+            state = joblib.load(path)
+            self._install(
+                state["vectorizer"],
+                state["products_df"],
+                state.get("tfidf_matrix"),
+                state["similarity_matrix"],
+                state.get("neighbor_index"),
+                price_bounds=state.get("price_bounds"),
+                version=state.get("version"),
+                reducer=state.get("reducer"),
+                embeddings=state.get("embeddings"),
+                shard_index=state.get("shard_index")
+            )
+            self.build_plan = state.get("build_plan")
+            self.feature_cache = state.get("feature_cache") or {}
+            self.fitted_at = state["fitted_at"]
+            self.watermark = state.get("watermark")
+            self.image_watermark = state.get("image_watermark")
+            self.status = STATUS_READY
+            self.error = None
+        return True
+    
+    def _build_response_fragments(self, products_df) -> List[bytes]:
+        """
+        Pre-encode each product's recommendation JSON up to its similarity score.
+
+        A recommendation object is ``fragment + score + b"}"``, so responses can
+        be assembled as bytes without building dicts or re-encoding strings.
+        """
+        if products_df is None:
+            return []
+        
+        fragments = []
+        for product in products_df.to_dict('records'):
+            encoded = orjson.dumps(self._recommendation_record(product))
+            fragments.append(encoded[:-1] + b',"similarity_score":')
+        return fragments
+    
+    @staticmethod
+    def _recommendation_record(product) -> Dict[str, Any]:
+        """Recommendation payload (without score) for one products_df row"""
+        import pandas as pd
+        
+        # Models saved before images were baked in have no image columns
+        image_url, image_alt = product.get('image_url'), product.get('image_alt')
+        return {
+            'id': str(product['id']),
+            'product_id': str(product['product_id']),
+            'name': product['name'],
+            'description': product['description'],
+            'category': product['category'],
+            # The Node.js app writes NULL price and stock; keep them null instead of failing the fit
+            'price': None if pd.isna(product['price']) else float(product['price']),
+            'stock': None if pd.isna(product['stock']) else int(product['stock']),
+            'user_id': product['user_id'],
+            'interaction_weight': float(product['interaction_weight']),
+            'interaction_type': product['interaction_type'],
+            'image': {
+                'url': image_url,
+                'alt': image_alt if isinstance(image_alt, str) else None
+            } if isinstance(image_url, str) else None
+        }
+    
+    def _build_filter_arrays(self, products_df) -> Dict[str, Any]:
+        """Precompute the per-category bitmaps and sorted price/stock arrays used by filters"""
+        if products_df is None:
+            return {}
+        
+        prices = products_df['price'].to_numpy(dtype=np.float64, na_value=np.nan)
+        # NaN prices sort last and are never inside a price range
+        price_order = np.argsort(prices, kind='stable')
+        categories = np.array([normalize_category(c) for c in products_df['category']], dtype=object)
+        
+        return {
+            'category_masks': {category: categories == category for category in set(categories)},
+            'price_order': price_order,
+            'sorted_prices': prices[price_order],
+            'priced_count': int(np.count_nonzero(~np.isnan(prices))),
+            'in_stock': products_df['stock'].fillna(0).to_numpy() > 0
+        }
+    
+    # Reads go through one snapshot each, taken when the call starts
+    
+    def get_recommendations(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        """See ModelSnapshot.get_recommendations"""
+        return self.snapshot.get_recommendations(*args, **kwargs)
+    
+    def get_recommendations_many(self, *args, **kwargs) -> List[List[Dict[str, Any]]]:
+        """See ModelSnapshot.get_recommendations_many"""
+        return self.snapshot.get_recommendations_many(*args, **kwargs)
+    
+    def get_recommendations_json(self, *args, **kwargs) -> bytes:
+        """See ModelSnapshot.get_recommendations_json"""
+        return self.snapshot.get_recommendations_json(*args, **kwargs)
+    
+    def get_popular(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        """See ModelSnapshot.get_popular"""
+        return self.snapshot.get_popular(*args, **kwargs)
+    
+    def search(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        """See ModelSnapshot.search"""
+        return self.snapshot.search(*args, **kwargs)
+    
+    def similarity_rows(self, rows: np.ndarray) -> np.ndarray:
+        """See ModelSnapshot.similarity_rows"""
+        return self.snapshot.similarity_rows(rows)
+    
+    def neighbor_lists(self, k: int, chunk_size: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+        """See ModelSnapshot.neighbor_lists"""
+        return self.snapshot.neighbor_lists(k, chunk_size)
+    
+    def get_personalized_recommendations(
+        self,
+        seeds: List[Dict[str, Any]],
+        top_n: int = 10,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: bool = False,
+        deadline: Optional[Deadline] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Rank products for a user from their interactions (see app/pipeline.py).
+
+        ``seeds`` are the user's interactions, strongest first (see
+        app/profiles.py). Returns the recommendations and the pipeline's
+        metadata: per-stage timings, candidate counts and skipped stages.
+        """
+        snapshot = self.snapshot
+        mask = snapshot._filter_mask(category, min_price, max_price, in_stock)
+        return self.pipeline.run(snapshot, seeds, top_n, mask, deadline)
+
+class ModelSnapshot:
+    """
+    Serving state of one model version: matrices, fragments, filters and positions.
+
+    A snapshot is built completely and then published by replacing
+    ``ConstructionProductRecommender.snapshot`` in one assignment; it is never
+    changed afterwards (apart from caches derived from it). A reader that
+    takes the snapshot once per request therefore always indexes fragments,
+    filter masks and similarity rows that belong to the same catalogue, even
+    while a refit or sync swaps in a new one.
+    """
+
+    def __init__(
+        self,
+        vectorizer=None,
+        products_df=None,
+        tfidf_matrix=None,
+        term_index=None,
+        similarity_matrix=None,
+        neighbor_index=None,
+        reducer=None,
+        embeddings=None,
+        shard_index=None,
+        response_fragments: Optional[List[bytes]] = None,
+        filter_arrays: Optional[Dict[str, Any]] = None,
+        price_bounds: Optional[Tuple[float, float]] = None,
+        cooccurrence_index: Optional[CoOccurrenceIndex] = None,
+        version: Optional[str] = None,
+        product_ids: Optional[List[str]] = None,
+        product_positions: Optional[Dict[str, int]] = None
+    ):
+        self.vectorizer = vectorizer
+        self.products_df = products_df
+        self.tfidf_matrix = tfidf_matrix
+        self.term_index = term_index
+        self.similarity_matrix = similarity_matrix
+        self.neighbor_index = neighbor_index
+        self.reducer = reducer
+        self.embeddings = embeddings
+        self.shard_index = shard_index
+        self.response_fragments = response_fragments if response_fragments is not None else []
+        self.filter_arrays = filter_arrays if filter_arrays is not None else {}
+        self.price_bounds = price_bounds
+        self.cooccurrence_index = cooccurrence_index
+        # Identifies one built model; changes on every fit or incremental update
+        self.version = version
+        self.product_ids = product_ids
+        self.product_positions = product_positions if product_positions is not None else {}
+        # (rows by interaction weight, weights) for popular_rows, computed on first use
+        self._popular_order = None
+    
+    def replace(self, **changes) -> "ModelSnapshot":
+        """Copy of this snapshot with some fields replaced and the same version and caches"""
+        snapshot = copy.copy(self)
+        for name, value in changes.items():
+            setattr(snapshot, name, value)
+        return snapshot
+    
+    def has_product(self, product_id: str) -> bool:
+        """True if the product is part of this snapshot"""
+        return product_id in self.product_positions
+    
+    def current_images(self, product_ids: List[str]) -> Dict[str, Tuple[str, Optional[str]]]:
+        """Default images baked into this snapshot for the given products"""
+        products_df = self.products_df
+        if products_df is None or 'image_url' not in products_df:
+            return {}
+        images = {}
+        for product_id in product_ids:
+            position = self.product_positions.get(product_id)
+            if position is not None and isinstance(products_df['image_url'].iat[position], str):
+                images[product_id] = (products_df['image_url'].iat[position], products_df['image_alt'].iat[position])
+        return images
+    
+    def _filter_mask(
+        self,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: bool = False
+    ) -> Optional[np.ndarray]:
+        """
+        Combine the requested filters into a boolean row mask.
+
+        ``category`` may be a comma-separated list of categories. Returns None
+        when no filter is requested.
+        """
+        arrays = self.filter_arrays
+        if not arrays:
+            return None
+        
+        n_products = len(arrays['in_stock'])
+        mask = None
+        
+        if category:
+            mask = np.zeros(n_products, dtype=bool)
+            for name in category.split(','):
+                category_mask = arrays['category_masks'].get(normalize_category(name))
+                if category_mask is not None:
+                    mask |= category_mask
+        
+        if min_price is not None or max_price is not None:
+            sorted_prices = arrays['sorted_prices']
+            start = np.searchsorted(sorted_prices, min_price, side='left') if min_price is not None else 0
+            stop = np.searchsorted(sorted_prices, max_price, side='right') if max_price is not None else arrays['priced_count']
+            price_mask = np.zeros(n_products, dtype=bool)
+            price_mask[arrays['price_order'][start:stop]] = True
+            mask = price_mask if mask is None else mask & price_mask
+        
+        if in_stock:
+            mask = arrays['in_stock'] if mask is None else mask & arrays['in_stock']
+        
+        return mask
+    
+    def _similar_indices(
+        self,
+        product_id: str,
+        top_n: int,
+        mask: Optional[np.ndarray] = None
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Row indices and scores of the top N neighbours of a product within ``mask``, best first"""
+        return self._similar_indices_many([product_id], top_n, mask)[0]
+    
+    def _similar_indices_many(
+        self,
+        product_ids: List[str],
+        top_n: int,
+        mask: Optional[np.ndarray] = None
+    ) -> List[Optional[Tuple[np.ndarray, np.ndarray]]]:
+        """
+        Top N neighbours of several products within ``mask`` from one batched scoring pass.
+
+        Entries are None for products that are not in the model.
+        """
+        results = [None] * len(product_ids)
+        if not self.product_ids or (
+            self.similarity_matrix is None and self.neighbor_index is None
+            and self.embeddings is None and self.shard_index is None
+        ):
+            return results
+        
+        positions = [self.product_positions.get(product_id) for product_id in product_ids]
+        
+        to_score = []
+        for i, product_index in enumerate(positions):
+            if product_index is None:
+                continue
+            if self.neighbor_index is not None and mask is None:
+                neighbor_indices, neighbor_scores = self.neighbor_index
+                row_indices = neighbor_indices[product_index]
+                if 0 < top_n <= len(row_indices) and row_indices[top_n - 1] >= 0:
+                    # Precomputed neighbours are already sorted and exclude the product itself
+                    results[i] = (
+                        row_indices[:top_n].astype(np.int64),
+                        neighbor_scores[product_index][:top_n].astype(np.float64)
+                    )
+                    continue
+            to_score.append(i)
+        
+        if to_score:
+            # Filtered or deeper top-K queries are scored exactly, all rows at once
+            rows = np.array([positions[i] for i in to_score], dtype=np.int64)
+            for i, similarity_scores in zip(to_score, self.similarity_rows(rows)):
+                results[i] = self._top_scores(similarity_scores, positions[i], top_n, mask)
+        return results
+    
+    @staticmethod
+    def _top_scores(
+        similarity_scores: np.ndarray,
+        product_index: int,
+        top_n: int,
+        mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Best N entries of one (writable) similarity row, excluding the product itself"""
+        if mask is not None:
+            similarity_scores[~mask] = -np.inf
+        similarity_scores[product_index] = -np.inf
+        
+        top_n = min(top_n, int(np.count_nonzero(similarity_scores > -np.inf)))
+        if top_n <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        
+        # Partial selection of the top N, then sort only those
+        candidates = np.argpartition(-similarity_scores, top_n - 1)[:top_n]
+        order = np.argsort(-similarity_scores[candidates], kind='stable')
+        similar_indices = candidates[order]
+        return similar_indices, similarity_scores[similar_indices]
+    
+    def _recommendation_records(self, similar_indices: np.ndarray, similarity_scores: np.ndarray) -> List[Dict[str, Any]]:
+        """Recommendation payloads for the given rows and scores, in order"""
+        recommendations = []
+        for idx, score in zip(similar_indices.tolist(), similarity_scores.tolist()):
+            recommendation = ConstructionProductRecommender._recommendation_record(self.products_df.iloc[idx])
+            recommendation['similarity_score'] = float(score)
+            recommendations.append(recommendation)
+        return recommendations
+    
+    def get_recommendations(
+        self,
+        product_id: str,
+        top_n: int = 5,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Get top N similar construction products for a given product ID.
+
+        Optional filters restrict the candidates before top-N selection, so
+        ``top_n`` results come back whenever enough products match.
+        """
+        mask = self._filter_mask(category, min_price, max_price, in_stock)
+        result = self._similar_indices(product_id, top_n, mask)
+        if result is None:
+            return []
+        
+        return self._recommendation_records(*result)
+    
+    def get_recommendations_many(
+        self,
+        product_ids: List[str],
+        top_n: int = 5,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        get_recommendations for several products at once.
+
+        The filter mask is built once and all rows that need scoring are
+        scored in a single matrix product. Unknown products get an empty list.
+        """
+        mask = self._filter_mask(category, min_price, max_price, in_stock)
+        return [
+            self._recommendation_records(*result) if result is not None else []
+            for result in self._similar_indices_many(product_ids, top_n, mask)
+        ]
+    
+    def popular_rows(self, top_n: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows with the highest interaction weight within ``mask``, and their weights"""
+        popular = self._popular_order
+        if popular is None:
+            weights = ConstructionProductRecommender._popularity_of(self.products_df)
+            popular = self._popular_order = (np.argsort(-weights, kind='stable'), weights)
+        order, weights = popular
+        
+        if mask is not None:
+            order = order[mask[order]]
+        rows = order[:top_n]
+        return rows, weights[rows]
+    
+    def get_popular(
+        self,
+        top_n: int = 10,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Products with the highest interaction weight, served from the model without a query"""
+        if self.products_df is None:
+            return []
+        rows, _ = self.popular_rows(top_n, self._filter_mask(category, min_price, max_price, in_stock))
+        return self._recommendation_records(rows, np.zeros(len(rows)))
+    
+    def get_recommendations_json(
+        self,
+        product_id: str,
+        top_n: int = 5,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: bool = False
+    ) -> bytes:
+        """
+        Same result as get_recommendations, encoded as a JSON array.
+
+        Uses the fragments cached at fit time, so the only per-request encoding
+        is the similarity scores.
+        """
+        mask = self._filter_mask(category, min_price, max_price, in_stock)
+        result = self._similar_indices(product_id, top_n, mask)
+        if result is None:
+            return b"[]"
+        
+        similar_indices, similarity_scores = result
+        fragments = self.response_fragments
+        return b"[" + b",".join(
+            fragments[idx] + orjson.dumps(score) + b"}"
+            for idx, score in zip(similar_indices.tolist(), similarity_scores.tolist())
+        ) + b"]"
+
+    def similarity_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Dense cosine similarities of the given product rows against every product"""
+        if self.similarity_matrix is not None:
+            return np.asarray(self.similarity_matrix[rows], dtype=np.float64)
+        if self.embeddings is not None:
+            return (self.embeddings[rows] @ self.embeddings.T).astype(np.float64)
+        if self.shard_index is not None:
+            return self.shard_index.rows(self.tfidf_matrix, rows)
+        # TF-IDF rows are L2-normalized, so dot products are cosine similarities
+        return (self.tfidf_matrix[rows] @ self.tfidf_matrix.T).toarray()
+    
+    def neighbor_lists(self, k: int, chunk_size: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-K neighbour row indices and scores of every product, best first.
+
+        Rows with fewer than K neighbours are padded with -1. Works for every
+        strategy; dense and svd similarities are reduced in chunks of rows.
+        """
+        if self.neighbor_index is not None:
+            indices, scores = self.neighbor_index
+            return indices[:, :k], scores[:, :k]
+        
+        if self.similarity_matrix is None and self.embeddings is None and self.shard_index is None:
+            return np.empty((0, k), dtype=np.int32), np.empty((0, k), dtype=np.float32)
+        
+        n_products = len(self.product_ids)
+        k_available = min(k, n_products - 1)
+        indices = np.full((n_products, k), -1, dtype=np.int32)
+        scores = np.zeros((n_products, k), dtype=np.float32)
+        if k_available <= 0:
+            return indices, scores
+        
+        for start in range(0, n_products, chunk_size):
+            stop = min(start + chunk_size, n_products)
+            block = self.similarity_rows(np.arange(start, stop))
+            # A product is never its own neighbour
+            block[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+            top = np.argpartition(-block, k_available - 1, axis=1)[:, :k_available]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            indices[start:stop, :k_available] = np.take_along_axis(top, order, axis=1)
+            scores[start:stop, :k_available] = np.take_along_axis(top_scores, order, axis=1)
+        return indices, scores
+    
+    def search(
+        self,
+        query: str,
+        top_n: int = 10,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Free-text product search over the fitted TF-IDF vocabulary.
+
+        The query is vectorized with the fitted vectorizer and multiplied with
+        the inverted term index, so only products sharing a term with the
+        query are scored. Terms outside the vocabulary are ignored.
+        """
+        vectorizer, term_index = self.vectorizer, self.term_index
+        if vectorizer is None or term_index is None:
             return []
+        
+        query_vector = vectorizer.transform([query])
+        if query_vector.nnz == 0:
+            return []
+        
+        # (1 x V) @ (V x N) touches only the postings of the query terms
+        scores = (query_vector @ term_index).tocsr()
+        indices, values = scores.indices, scores.data
+        
+        mask = self._filter_mask(category, min_price, max_price, in_stock)
+        if mask is not None:
+            keep = mask[indices]
+            indices, values = indices[keep], values[keep]
+        
+        top_n = min(top_n, len(indices))
+        if top_n <= 0:
+            return []
+        
+        candidates = np.argpartition(-values, top_n - 1)[:top_n]
+        order = np.argsort(-values[candidates], kind='stable')
+        
+        results = []
+        for position in candidates[order].tolist():
+            result = ConstructionProductRecommender._recommendation_record(self.products_df.iloc[indices[position]])
+            result['score'] = float(values[position])
+            results.append(result)
+        return results
 
 # Global recommender instance
 recommender = ConstructionProductRecommender()
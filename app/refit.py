@@ -0,0 +1,167 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Rebuild once no write has arrived for this many seconds...
+REFIT_DEBOUNCE = float(os.getenv("RECOMMENDER_REFIT_DEBOUNCE", "2"))
+
+# ...but never leave a change unbuilt for longer than this
+REFIT_MAX_STALENESS = float(os.getenv("RECOMMENDER_REFIT_MAX_STALENESS", "30"))
+
+# A failed rebuild is retried after this many seconds, doubling per consecutive failure
+REFIT_RETRY_BACKOFF = float(os.getenv("RECOMMENDER_REFIT_RETRY_BACKOFF", "5"))
+REFIT_RETRY_MAX_BACKOFF = 300
+
+class RefitScheduler:
+    """
+    Debounce and coalesce model rebuilds triggered by writes.
+
+    Writes call mark_dirty() and return immediately. A single background
+    thread rebuilds once writes have been quiet for ``debounce`` seconds, or
+    once the oldest pending change is ``max_staleness`` seconds old, so a
+    burst of N writes costs one or a few rebuilds instead of N. Only one
+    rebuild runs at a time; changes that arrive during a rebuild are picked
+    up by the next one. While ``busy()`` is true (the API is shedding load)
+    quiet-period rebuilds are held back, so a rebuild competes with requests
+    for the CPU only once ``max_staleness`` forces it. A failed rebuild
+    puts its changes back and is retried after ``retry_backoff`` seconds,
+    doubling for each consecutive failure.
+    """
+
+    def __init__(
+        self,
+        rebuild: Callable[[], None],
+        debounce: float = REFIT_DEBOUNCE,
+        max_staleness: float = REFIT_MAX_STALENESS,
+        busy: Optional[Callable[[], bool]] = None,
+        retry_backoff: float = REFIT_RETRY_BACKOFF
+    ):
+        self.rebuild = rebuild
+        self.busy = busy
+        self.debounce = debounce
+        self.max_staleness = max(debounce, max_staleness)
+        self.retry_backoff = retry_backoff
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+        self.pending_changes = 0
+        self._first_change = None
+        self._last_change = None
+        self.rebuilding = False
+        self.builds = 0
+        self.last_build_at = None
+        self.last_build_seconds = None
+        self.last_error = None
+        self.deferrals = 0
+        self.failures = 0
+        self._retry_at = None
+
+    def start(self):
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="recommender-refit", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def mark_dirty(self, changes: int = 1):
+        """Record that the model no longer reflects ``changes`` written rows"""
+        now = time.monotonic()
+        with self._condition:
+            self.pending_changes += changes
+            self._last_change = now
+            if self._first_change is None:
+                self._first_change = now
+            self._condition.notify_all()
+
+    def _due_in(self) -> Optional[float]:
+        """Seconds until the pending changes should be rebuilt (None if nothing is pending)"""
+        if not self.pending_changes:
+            return None
+        deadline = self._first_change + self.max_staleness
+        due = min(self._last_change + self.debounce, deadline)
+        now = time.monotonic()
+        if self._retry_at is not None and self._retry_at > now:
+            # Backing off after a failed rebuild
+            return self._retry_at - now
+        if due < deadline and due <= now and self.busy is not None and self.busy():
+            # Re-check the load a debounce period later
+            self.deferrals += 1
+            return min(self.debounce, deadline - now)
+        return max(0.0, due - now)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopping:
+                    due_in = self._due_in()
+                    if due_in == 0:
+                        break
+                    self._condition.wait(due_in)
+                if self._stopping:
+                    return
+                changes = self.pending_changes
+                first_change, last_change = self._first_change, self._last_change
+                self.pending_changes = 0
+                self._first_change = self._last_change = None
+                self.rebuilding = True
+
+            started = time.monotonic()
+            try:
+                self.rebuild()
+                with self._condition:
+                    self.last_error = None
+                    self.failures = 0
+                    self._retry_at = None
+                logger.info("Rebuilt recommender for %d pending changes", changes)
+            except Exception as e:
+                with self._condition:
+                    # Put the changes back, as old as they were, so they are not lost
+                    self.pending_changes += changes
+                    if self._first_change is not None:
+                        first_change = min(first_change, self._first_change)
+                        last_change = max(last_change, self._last_change)
+                    self._first_change, self._last_change = first_change, last_change
+                    self.failures += 1
+                    backoff = min(self.retry_backoff * 2 ** (self.failures - 1), REFIT_RETRY_MAX_BACKOFF)
+                    self._retry_at = time.monotonic() + backoff
+                    self.last_error = str(e)
+                logger.exception("Recommender rebuild failed; retrying in %.1f s", backoff)
+            finally:
+                with self._condition:
+                    self.rebuilding = False
+                    self.builds += 1
+                    self.last_build_at = datetime.utcnow()
+                    self.last_build_seconds = time.monotonic() - started
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            oldest = time.monotonic() - self._first_change if self._first_change is not None else None
+            return {
+                "pending_changes": self.pending_changes,
+                "oldest_pending_seconds": oldest,
+                "rebuilding": self.rebuilding,
+                "builds": self.builds,
+                "last_build_at": self.last_build_at.isoformat() + "Z" if self.last_build_at else None,
+                "last_build_seconds": self.last_build_seconds,
+                "last_error": self.last_error,
+                "deferrals": self.deferrals,
+                "consecutive_failures": self.failures,
+                "retry_in_seconds": max(0.0, self._retry_at - time.monotonic()) if self._retry_at is not None else None,
+                "debounce_seconds": self.debounce,
+                "max_staleness_seconds": self.max_staleness
+            }
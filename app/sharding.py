@@ -0,0 +1,135 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+# Most popular products compared against every product across categories
+DEFAULT_GLOBAL_ITEMS = 100
+
+def _shard_similarity(matrix) -> np.ndarray:
+    """Dense cosine similarities within one shard (rows are L2-normalized)"""
+    return (matrix @ matrix.T).toarray().astype(np.float32)
+
+class ShardIndex:
+    """
+    Category-sharded similarity: one dense matrix per category plus a global layer.
+
+    Products are only compared exhaustively with products of their own
+    (normalized) category, so building costs sum(N_i^2) instead of N^2 and
+    a change only recomputes the shards it touches. A small global layer of
+    the ``global_items`` most popular products is scored against every
+    query on demand, so strong cross-category matches among them still
+    surface. Scores outside a product's shard and the global layer are 0.
+    """
+
+    def __init__(
+        self,
+        shard_of: np.ndarray,
+        members: List[np.ndarray],
+        matrices: List[np.ndarray],
+        global_rows: np.ndarray,
+        global_matrix_t
+    ):
+        self.shard_of = shard_of
+        self.members = members
+        self.matrices = matrices
+        self.global_rows = global_rows
+        self.global_matrix_t = global_matrix_t
+        # Shards computed (rather than reused) by the build that produced this index
+        self.rebuilt_shards = len(members)
+
+        # Position of every row inside its shard's matrix
+        self.local_index = np.empty(len(shard_of), dtype=np.int64)
+        for rows in members:
+            self.local_index[rows] = np.arange(len(rows))
+
+    @property
+    def shard_sizes(self) -> List[int]:
+        return [len(rows) for rows in self.members]
+
+    @staticmethod
+    def _partition(categories: List[str]):
+        names = sorted(set(categories))
+        shard_ids = {name: i for i, name in enumerate(names)}
+        shard_of = np.array([shard_ids[category] for category in categories], dtype=np.int64)
+        order = np.argsort(shard_of, kind='stable')
+        boundaries = np.searchsorted(shard_of[order], np.arange(len(names) + 1))
+        members = [order[boundaries[i]:boundaries[i + 1]] for i in range(len(names))]
+        return names, shard_of, members
+
+    @staticmethod
+    def _global_layer(tfidf_matrix, popularity: np.ndarray, global_items: int):
+        global_items = min(global_items, len(popularity))
+        if global_items <= 0:
+            return np.empty(0, dtype=np.int64), None
+        global_rows = np.sort(np.argsort(-popularity, kind='stable')[:global_items])
+        return global_rows, tfidf_matrix[global_rows].T.tocsr()
+
+    @classmethod
+    def build(
+        cls,
+        tfidf_matrix,
+        categories: List[str],
+        popularity: np.ndarray,
+        global_items: int = DEFAULT_GLOBAL_ITEMS,
+        workers: int = 1,
+        previous: Optional["ShardIndex"] = None,
+        previous_categories: Optional[List[str]] = None,
+        changed: Iterable[int] = ()
+    ) -> "ShardIndex":
+        """
+        Build every shard, or with ``previous`` only the shards touched by ``changed`` rows.
+
+        Incremental builds assume existing rows kept their positions and new
+        rows were appended (as in apply_changes); ``previous_categories`` are
+        the categories the previous index was built with.
+        """
+        from scipy.sparse import csr_matrix
+
+        matrix = csr_matrix(tfidf_matrix)
+        names, shard_of, members = cls._partition(categories)
+
+        reusable = {}
+        if previous is not None and previous_categories is not None:
+            previous_names = sorted(set(previous_categories))
+            changed = set(changed)
+            dirty = {categories[row] for row in changed}
+            dirty |= {previous_categories[row] for row in changed if row < len(previous_categories)}
+            for old_id, name in enumerate(previous_names):
+                if name not in dirty:
+                    reusable[name] = previous.matrices[old_id]
+
+        to_build = [i for i, name in enumerate(names) if name not in reusable]
+        shard_matrices = [matrix[members[i]] for i in to_build]
+        workers = max(1, min(workers, len(to_build)))
+        if workers == 1:
+            built = [_shard_similarity(shard) for shard in shard_matrices]
+        else:
+            # Shards are independent; spawn because fit may run inside a threaded server
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                built = list(pool.map(_shard_similarity, shard_matrices))
+
+        matrices = [reusable.get(name) for name in names]
+        for i, shard_matrix in zip(to_build, built):
+            matrices[i] = shard_matrix
+
+        global_rows, global_matrix_t = cls._global_layer(matrix, popularity, global_items)
+        index = cls(shard_of, members, matrices, global_rows, global_matrix_t)
+        index.rebuilt_shards = len(to_build)
+        return index
+
+    def rows(self, tfidf_matrix, rows: np.ndarray) -> np.ndarray:
+        """Similarities of the given rows against every product (0 outside shard and global layer)"""
+        scores = np.zeros((len(rows), len(self.shard_of)), dtype=np.float64)
+        for i, row in enumerate(rows.tolist()):
+            shard = self.shard_of[row]
+            scores[i, self.members[shard]] = self.matrices[shard][self.local_index[row]]
+
+        if self.global_matrix_t is not None:
+            global_scores = (tfidf_matrix[rows] @ self.global_matrix_t).toarray()
+            scores[:, self.global_rows] = np.maximum(scores[:, self.global_rows], global_scores)
+        return scores
+
+    def memory_bytes(self) -> int:
+        return sum(matrix.nbytes for matrix in self.matrices)
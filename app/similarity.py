@@ -0,0 +1,186 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Neighbours kept per product by the top-K strategy
+DEFAULT_NEIGHBORS = 50
+
+# Rows per block; one block x all product is computed at a time per worker
+DEFAULT_BLOCK_SIZE = 1024
+
+# CSR matrices memory-mapped by each pool worker (set by _init_worker)
+_worker_matrix = None
+_worker_matrix_t = None
+
+def _save_csr(matrix, directory: str, name: str):
+    """Write a CSR matrix's arrays as .npy files that workers can memory-map"""
+    np.save(os.path.join(directory, f"{name}_data.npy"), matrix.data)
+    np.save(os.path.join(directory, f"{name}_indices.npy"), matrix.indices)
+    np.save(os.path.join(directory, f"{name}_indptr.npy"), matrix.indptr)
+
+def _load_csr(directory: str, name: str, shape: Tuple[int, int]):
+    """Rebuild a CSR matrix on top of memory-mapped arrays (no copy, no pickling)"""
+    from scipy.sparse import csr_matrix
+
+    arrays = [
+        np.load(os.path.join(directory, f"{name}_{part}.npy"), mmap_mode="r")
+        for part in ("data", "indices", "indptr")
+    ]
+    return csr_matrix(tuple(arrays), shape=shape, copy=False)
+
+def _init_worker(directory: str, shape: Tuple[int, int]):
+    global _worker_matrix, _worker_matrix_t
+    _worker_matrix = _load_csr(directory, "matrix", shape)
+    _worker_matrix_t = _load_csr(directory, "matrix_t", (shape[1], shape[0]))
+
+def _worker_block(start: int, stop: int, k: int):
+    return start, *_block_top_k(_worker_matrix, _worker_matrix_t, start, stop, k)
+
+def _block_top_k(matrix, matrix_t, start: int, stop: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-K neighbours of rows [start, stop) against every row.
+
+    Rows of ``matrix`` must be L2-normalized so that dot products are cosine
+    similarities. Rows with fewer than K non-zero neighbours are padded with
+    index -1 and score 0.
+    """
+    return _product_top_k((matrix[start:stop] @ matrix_t).tocsr(), np.arange(start, stop), k)
+
+def _product_top_k(block, row_ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Reduce each row of a sparse (rows x all) similarity block to its top-K"""
+    n_rows = block.shape[0]
+    indices = np.full((n_rows, k), -1, dtype=np.int32)
+    scores = np.zeros((n_rows, k), dtype=np.float32)
+
+    for row in range(n_rows):
+        lo, hi = block.indptr[row], block.indptr[row + 1]
+        columns, values = block.indices[lo:hi], block.data[lo:hi]
+
+        # A product is never its own neighbour
+        keep = columns != row_ids[row]
+        columns, values = columns[keep], values[keep]
+
+        if len(values) > k:
+            top = np.argpartition(-values, k - 1)[:k]
+            columns, values = columns[top], values[top]
+        order = np.argsort(-values, kind="stable")
+        indices[row, :len(order)] = columns[order]
+        scores[row, :len(order)] = values[order]
+
+    return indices, scores
+
+def rows_top_k(tfidf_matrix, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact top-K neighbours of selected rows only (used for incremental updates)"""
+    from scipy.sparse import csr_matrix
+
+    matrix = csr_matrix(tfidf_matrix, dtype=np.float32)
+    rows = np.asarray(rows, dtype=np.int64)
+    return _product_top_k((matrix[rows] @ matrix.T).tocsr(), rows, k)
+
+def merge_changed_neighbors(
+    indices: np.ndarray,
+    scores: np.ndarray,
+    tfidf_matrix,
+    changed: np.ndarray,
+    chunk_size: int = 64
+):
+    """
+    Update every product's top-K list in place after rows ``changed`` changed.
+
+    Stale entries for the changed products are dropped and their new scores
+    merged in, so each row only has to look at K + len(changed) candidates
+    instead of the whole catalog. A row that loses a changed neighbour may
+    end up with fewer than K entries (padded with -1) until the next full
+    build. Rows ``changed`` themselves should be recomputed with rows_top_k.
+    """
+    from scipy.sparse import csr_matrix
+
+    matrix = csr_matrix(tfidf_matrix, dtype=np.float32)
+    n_rows, k = indices.shape
+    changed = np.asarray(changed, dtype=np.int64)
+    row_ids = np.arange(n_rows)[:, None]
+
+    for chunk_start in range(0, len(changed), chunk_size):
+        columns = changed[chunk_start:chunk_start + chunk_size]
+        column_scores = (matrix @ matrix[columns].T).toarray().astype(np.float32)
+
+        current_scores = np.where(indices >= 0, scores, -np.inf).astype(np.float32)
+        current_scores[np.isin(indices, columns)] = -np.inf
+
+        # Zero similarity is never stored, and a product is never its own neighbour
+        candidate_indices = np.concatenate([indices, np.broadcast_to(columns, (n_rows, len(columns)))], axis=1)
+        candidate_scores = np.concatenate([current_scores, np.where(column_scores > 0, column_scores, -np.inf)], axis=1)
+        candidate_scores[candidate_indices == row_ids] = -np.inf
+
+        top = np.argpartition(-candidate_scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(candidate_scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        valid = np.isfinite(top_scores)
+        indices[:] = np.where(valid, np.take_along_axis(candidate_indices, top, axis=1), -1)
+        scores[:] = np.where(valid, top_scores, 0)
+
+def top_k_neighbors(
+    tfidf_matrix,
+    k: int = DEFAULT_NEIGHBORS,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute each product's top-K cosine neighbours block by block.
+
+    The row space is split into blocks of ``block_size`` rows; each block is
+    multiplied with the whole (transposed) matrix and reduced to its top-K
+    before the next one, so peak memory is one block's products rather than
+    N x N. With ``workers`` > 1 the blocks run in a process pool whose
+    workers memory-map the matrix from a temporary directory instead of
+    receiving it pickled. Returns ``(indices, scores)``, both N x K, with
+    each row sorted by descending score.
+    """
+    from scipy.sparse import csr_matrix
+
+    matrix = csr_matrix(tfidf_matrix, dtype=np.float32)
+    n_rows = matrix.shape[0]
+    k = max(1, min(k, n_rows - 1)) if n_rows > 1 else 1
+    block_size = max(1, block_size)
+    workers = max(1, min(workers or os.cpu_count() or 1, (n_rows + block_size - 1) // block_size))
+
+    indices = np.full((n_rows, k), -1, dtype=np.int32)
+    scores = np.zeros((n_rows, k), dtype=np.float32)
+    blocks = [(start, min(start + block_size, n_rows)) for start in range(0, n_rows, block_size)]
+    matrix_t = matrix.T.tocsr()
+
+    if workers == 1:
+        for start, stop in blocks:
+            indices[start:stop], scores[start:stop] = _block_top_k(matrix, matrix_t, start, stop, k)
+        return indices, scores
+
+    directory = tempfile.mkdtemp(prefix="recommender-similarity-")
+    try:
+        _save_csr(matrix, directory, "matrix")
+        _save_csr(matrix_t, directory, "matrix_t")
+        del matrix_t
+
+        # spawn rather than fork: fit may run inside a threaded server process
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(directory, matrix.shape)
+        ) as pool:
+            futures = [pool.submit(_worker_block, start, stop, k) for start, stop in blocks]
+            for future in futures:
+                start, block_indices, block_scores = future.result()
+                stop = start + len(block_indices)
+                indices[start:stop], scores[start:stop] = block_indices, block_scores
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return indices, scores
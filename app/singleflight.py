@@ -0,0 +1,62 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical requests into one computation.
+
+    The first caller for a key starts the computation; callers arriving with
+    the same key while it is still running await the same result (or
+    exception) instead of starting their own. Nothing is cached: once the
+    computation finishes the next caller starts a fresh one, so results are
+    never staler than the request itself.
+
+    Must be used from a single event loop.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.requests = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_waiters = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Return ``await fn()``, sharing one in-flight call per ``key``"""
+        self.requests += 1
+        future = self._in_flight.get(key)
+        if future is None:
+            self.executions += 1
+            future = asyncio.ensure_future(fn())
+            self._in_flight[key] = future
+            self._waiters[key] = 1
+            future.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+            self._waiters[key] += 1
+            self.max_waiters = max(self.max_waiters, self._waiters[key])
+
+        # Shield so that one caller disconnecting does not cancel the shared call
+        return await asyncio.shield(future)
+
+    def _finish(self, key: Hashable, future: asyncio.Future):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+            del self._waiters[key]
+        if not future.cancelled() and future.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": self.coalesced / self.requests if self.requests else 0.0,
+            "errors": self.errors,
+            "in_flight": len(self._in_flight),
+            "max_waiters": self.max_waiters
+        }
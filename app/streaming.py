@@ -0,0 +1,98 @@
+import base64
+import json
+from typing import Iterator, Optional
+
+from .database import SessionLocal
+from .models import Product
+
+# Rows fetched from the server-side cursor per round trip
+DEFAULT_CHUNK_SIZE = 1000
+MAX_CHUNK_SIZE = 10000
+
+# Only the columns we export, so rows stay small tuples instead of ORM objects
+EXPORT_COLUMNS = (
+    Product.id,
+    Product.user_id,
+    Product.name,
+    Product.description,
+    Product.category,
+    Product.price,
+    Product.stock,
+    Product.interaction_type,
+    Product.interaction_weight,
+    Product.created_at,
+)
+
+def encode_resume_token(last_id: str) -> str:
+    """Turn the last exported primary key into an opaque resumption token"""
+    return base64.urlsafe_b64encode(last_id.encode()).decode().rstrip("=")
+
+def decode_resume_token(token: str) -> str:
+    """Inverse of encode_resume_token; raises ValueError on a malformed token"""
+    padded = token + "=" * (-len(token) % 4)
+    try:
+        return base64.urlsafe_b64decode(padded.encode()).decode()
+    except Exception as e:
+        raise ValueError("Invalid resume token") from e
+
+def _row_to_json(row) -> str:
+    return json.dumps({
+        "id": row.id,
+        "user_id": row.user_id,
+        "name": row.name,
+        "description": row.description,
+        "category": row.category,
+        "price": row.price,
+        "stock": row.stock,
+        "interaction_type": row.interaction_type,
+        "interaction_weight": row.interaction_weight,
+        "created_at": row.created_at.isoformat() + "Z" if row.created_at else None
+    })
+
+def iter_interactions_ndjson(
+    user_id: Optional[str] = None,
+    after: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Stream interaction rows as NDJSON in primary-key order.
+
+    Rows are read through a server-side cursor ``chunk_size`` at a time and
+    written out as soon as each chunk arrives, so memory stays flat no matter
+    how long the history is. After every chunk a ``{"resume_token": ...}``
+    line is emitted; passing it back as ``after`` continues the export right
+    after the last row already received. The stream ends with a
+    ``{"done": true, ...}`` line so clients can tell a complete export from a
+    dropped connection.
+    """
+    last_id = decode_resume_token(after) if after else None
+
+    # The session is owned by the generator because the response body is
+    # produced after the endpoint (and its request-scoped session) returns
+    db = SessionLocal()
+    try:
+        query = db.query(*EXPORT_COLUMNS).filter(Product.user_id.isnot(None))
+        if user_id:
+            query = query.filter(Product.user_id == user_id)
+        if last_id is not None:
+            query = query.filter(Product.id > last_id)
+        query = query.order_by(Product.id).yield_per(chunk_size)
+
+        exported = 0
+        lines = []
+        for row in query:
+            lines.append(_row_to_json(row))
+            last_id = row.id
+            if len(lines) >= chunk_size:
+                exported += len(lines)
+                lines.append(json.dumps({"resume_token": encode_resume_token(last_id)}))
+                yield ("\n".join(lines) + "\n").encode()
+                lines = []
+
+        exported += len(lines)
+        if lines:
+            lines.append(json.dumps({"resume_token": encode_resume_token(last_id)}))
+        lines.append(json.dumps({"done": True, "rows": exported}))
+        yield ("\n".join(lines) + "\n").encode()
+    finally:
+        db.close()
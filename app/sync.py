@@ -0,0 +1,246 @@
+import logging
+import os
+import threading
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, or_
+
+from .database import SessionLocal
+from .models import Product, ProductImage
+from .recommender import ConstructionProductRecommender
+
+logger = logging.getLogger(__name__)
+
+# Seconds between polls while changes keep arriving (0 disables the sync loop)
+SYNC_INTERVAL = float(os.getenv("RECOMMENDER_SYNC_INTERVAL", "30"))
+
+# Upper bound for the idle backoff; the interval doubles after each empty poll
+SYNC_MAX_INTERVAL = float(os.getenv("RECOMMENDER_SYNC_MAX_INTERVAL", "300"))
+
+# Changed rows read and applied per batch
+SYNC_BATCH_SIZE = int(os.getenv("RECOMMENDER_SYNC_BATCH_SIZE", "500"))
+
+# Seconds re-read behind the watermark on every poll, for rows whose transaction
+# committed after rows with a later updated_at had already been polled
+SYNC_LAG = float(os.getenv("RECOMMENDER_SYNC_LAG", "5"))
+
+class ChangeDataSync:
+    """
+    Poll the products table for rows written outside this service (e.g. by
+    the Node.js app) and fold them into the model incrementally.
+
+    Changes are found by the model's (updated_at, id) watermark, so each poll
+    reads only rows newer than what the model already reflects, in batches
+    of ``batch_size``. product_images is followed the same way with its own
+    watermark, refreshing the default image baked into the model for every
+    product whose images changed. The watermarks are saved with the model
+    artifact, so a restart that loads the artifact resumes from where it
+    left off. Rows deleted directly in the database are not visible to this
+    loop and drop out at the next full fit. A row can commit after the
+    watermark has passed its updated_at (a long transaction, clock skew
+    between writers), so every poll also re-reads the last ``lag`` seconds
+    behind the watermark and applies the rows in it that were not seen with
+    that updated_at yet. Rows later than ``lag`` are missed until the next
+    full fit; after a restart or fit the window is applied once again, which
+    apply_changes tolerates. ``on_products`` is called with
+    every batch of changed rows once the model reflects it (e.g. to update
+    cached user profiles), and ``on_change`` once per poll that changed
+    anything.
+    """
+
+    def __init__(
+        self,
+        recommender: ConstructionProductRecommender,
+        interval: float = SYNC_INTERVAL,
+        max_interval: float = SYNC_MAX_INTERVAL,
+        batch_size: int = SYNC_BATCH_SIZE,
+        lag: float = SYNC_LAG,
+        on_change: Optional[Callable[[], None]] = None,
+        on_products: Optional[Callable[[List[Product]], None]] = None
+    ):
+        self.recommender = recommender
+        self.interval = interval
+        self.max_interval = max(interval, max_interval)
+        self.batch_size = batch_size
+        self.lag = lag
+        self.on_change = on_change
+        self.on_products = on_products
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        # updated_at of the rows applied within the lag window, by row id
+        self._seen: Dict[str, object] = {}
+        self._seen_images: Dict[str, object] = {}
+
+    def start(self):
+        """Start the background polling thread (no-op when the interval is 0)"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._wake.clear()
+        self._thread = threading.Thread(target=self._run, name="recommender-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def request(self) -> bool:
+        """Poll now instead of at the next interval; False when the loop is not running"""
+        if self._thread is None:
+            return False
+        self._wake.set()
+        return True
+
+    def _run(self):
+        delay = self.interval
+        while True:
+            self._wake.wait(delay)
+            if self._stop.is_set():
+                return
+            # Writes requested during this poll wake the next one
+            self._wake.clear()
+            try:
+                applied = self.poll_once()
+            except Exception:
+                logger.exception("Recommender sync poll failed")
+                applied = 0
+            # Back off while idle, snap back as soon as something changes
+            delay = self.interval if applied else min(delay * 2, self.max_interval)
+
+    def poll_once(self) -> int:
+        """Apply every row changed since the watermark; returns the number applied"""
+        if not self.recommender.is_ready:
+            return 0
+
+        applied = 0
+        db = SessionLocal()
+        try:
+            applied += self.poll_late(db)
+            while True:
+                query = db.query(Product).filter(Product.updated_at.isnot(None))
+                watermark = self.recommender.watermark
+                if watermark is not None:
+                    updated_at, product_id = watermark
+                    query = query.filter(or_(
+                        Product.updated_at > updated_at,
+                        and_(Product.updated_at == updated_at, Product.id > product_id)
+                    ))
+                batch = query.order_by(Product.updated_at, Product.id).limit(self.batch_size).all()
+                if not batch:
+                    break
+
+                images = self.recommender.default_images_of(db, [product.id for product in batch])
+                if not self.recommender.apply_changes(batch, images=images):
+                    # Nothing fitted to update incrementally (e.g. the catalog
+                    # was empty at start-up): build from scratch instead
+                    self.recommender.fit(db)
+                    if self.on_products:
+                        self.on_products(batch)
+                    applied += len(batch)
+                    break
+
+                if self.on_products:
+                    self.on_products(batch)
+                self._remember(self._seen, [(product.id, product.updated_at) for product in batch], self.recommender.watermark)
+                applied += len(batch)
+                if len(batch) < self.batch_size:
+                    break
+
+            applied += self.poll_late_images(db)
+            applied += self.poll_images(db)
+        finally:
+            db.close()
+
+        if applied:
+            logger.info("Recommender sync applied %d changed products", applied)
+            if self.on_change:
+                self.on_change()
+        return applied
+
+    def poll_images(self, db) -> int:
+        """Refresh the default images of products whose images changed since the image watermark"""
+        refreshed = 0
+        while True:
+            query = db.query(ProductImage.updated_at, ProductImage.id, ProductImage.product_id).filter(
+                ProductImage.updated_at.isnot(None)
+            )
+            watermark = self.recommender.image_watermark
+            if watermark is not None:
+                updated_at, image_id = watermark
+                query = query.filter(or_(
+                    ProductImage.updated_at > updated_at,
+                    and_(ProductImage.updated_at == updated_at, ProductImage.id > image_id)
+                ))
+            batch = query.order_by(ProductImage.updated_at, ProductImage.id).limit(self.batch_size).all()
+            if not batch:
+                break
+
+            product_ids = sorted({row.product_id for row in batch})
+            images = self.recommender.default_images_of(db, product_ids)
+            last = batch[-1]
+            refreshed += self.recommender.apply_image_changes(images, product_ids, watermark=(last.updated_at, last.id))
+            self._remember(self._seen_images, [(row.id, row.updated_at) for row in batch], self.recommender.image_watermark)
+            if len(batch) < self.batch_size:
+                break
+        return refreshed
+
+    def poll_late(self, db) -> int:
+        """Apply products in the lag window behind the watermark that committed after it passed them"""
+        watermark = self.recommender.watermark
+        if watermark is None or self.lag <= 0:
+            return 0
+        late = [
+            product for product in self._behind(db.query(Product), Product.updated_at, Product.id, watermark)
+            if self._seen.get(product.id) != product.updated_at
+        ]
+        if not late:
+            return 0
+
+        images = self.recommender.default_images_of(db, [product.id for product in late])
+        # Older than the watermark, so it stays where it is
+        if not self.recommender.apply_changes(late, images=images):
+            return 0
+        if self.on_products:
+            self.on_products(late)
+        self._remember(self._seen, [(product.id, product.updated_at) for product in late], watermark)
+        return len(late)
+
+    def poll_late_images(self, db) -> int:
+        """Refresh default images changed in the lag window behind the image watermark"""
+        watermark = self.recommender.image_watermark
+        if watermark is None or self.lag <= 0:
+            return 0
+        query = db.query(ProductImage.updated_at, ProductImage.id, ProductImage.product_id)
+        late = [
+            row for row in self._behind(query, ProductImage.updated_at, ProductImage.id, watermark)
+            if self._seen_images.get(row.id) != row.updated_at
+        ]
+        if not late:
+            return 0
+
+        product_ids = sorted({row.product_id for row in late})
+        refreshed = self.recommender.apply_image_changes(self.recommender.default_images_of(db, product_ids), product_ids)
+        self._remember(self._seen_images, [(row.id, row.updated_at) for row in late], watermark)
+        return refreshed
+
+    def _behind(self, query, updated_column, id_column, watermark):
+        """Rows of ``query`` at or behind ``watermark`` but within the lag window"""
+        updated_at, row_id = watermark
+        return query.filter(
+            updated_column >= updated_at - timedelta(seconds=self.lag),
+            or_(updated_column < updated_at, and_(updated_column == updated_at, id_column <= row_id))
+        ).order_by(updated_column, id_column).all()
+
+    def _remember(self, seen: Dict[str, object], rows, watermark):
+        """Record applied (id, updated_at) pairs and forget those that left the lag window"""
+        seen.update(rows)
+        if watermark is None:
+            return
+        cutoff = watermark[0] - timedelta(seconds=self.lag)
+        for row_id in [row_id for row_id, updated_at in seen.items() if updated_at < cutoff]:
+            del seen[row_id]
@@ -0,0 +1,57 @@
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Dict, Any
+
+from sqlalchemy.orm import Session
+
+from .models import Product
+
+# Building blocks for plausible construction products
+SYNTHETIC_CATALOG = {
+    'cement': (['Portland cement', 'Ready-mix concrete', 'Masonry mortar', 'Tile grout'], (8, 40)),
+    'steel': (['Steel rebar', 'I-beam', 'Steel column', 'Threaded rod'], (15, 600)),
+    'lumber': (['Pine lumber', 'Oak board', 'Timber plank', 'Plywood sheet'], (5, 120)),
+    'electrical': (['Copper wire', 'Coax cable', 'Wall switch', 'Power outlet'], (2, 90)),
+    'plumbing': (['PVC pipe', 'Ball valve', 'Elbow fitting', 'Kitchen faucet'], (3, 250)),
+    'roofing': (['Asphalt shingle', 'Clay roof tile', 'Rain gutter', 'Roof drain'], (10, 200)),
+    'flooring': (['Ceramic tile', 'Carpet roll', 'Hardwood floor', 'Vinyl plank'], (12, 180)),
+    'tools': (['Claw hammer', 'Cordless drill', 'Circular saw', 'Spirit level'], (10, 300)),
+    'safety': (['Hard hat helmet', 'Work gloves', 'Safety goggles', 'Hi-vis vest'], (4, 60)),
+}
+SYNTHETIC_SIZES = ['10 kg', '25 kg', '2x4', '12 inch', '3 ft', '50 mm', '100 lb', '6 meter']
+SYNTHETIC_INTERACTIONS = [('view', 1.0), ('click', 2.0), ('add_to_cart', 5.0), ('purchase', 10.0)]
+
+def generate_products(n: int, n_users: int = 50, seed: int = 42) -> List[Dict[str, Any]]:
+    """Generate ``n`` synthetic product rows shaped like the products table"""
+    rng = random.Random(seed)
+    categories = list(SYNTHETIC_CATALOG)
+    started = datetime(2024, 1, 1)
+    rows = []
+    for i in range(n):
+        category = rng.choice(categories)
+        names, (low, high) = SYNTHETIC_CATALOG[category]
+        name = f"{rng.choice(names)} {rng.choice(SYNTHETIC_SIZES)}"
+        interaction_type, interaction_weight = rng.choice(SYNTHETIC_INTERACTIONS)
+        rows.append({
+            'id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'product_id': f"synthetic-{i}",
+            'name': name,
+            'description': f"{name} for {category} work, grade {rng.choice('ABC')}",
+            'category': category,
+            'price': round(rng.uniform(low, high), 2),
+            'stock': rng.choice([0, 0, 5, 20, 100]),
+            'user_id': f"user-{rng.randrange(n_users)}" if rng.random() < 0.8 else None,
+            'interaction_type': interaction_type,
+            'interaction_weight': interaction_weight,
+            'created_at': started + timedelta(minutes=i),
+            'updated_at': started + timedelta(minutes=i),
+        })
+    return rows
+
+def seed_database(db: Session, n: int, n_users: int = 50, seed: int = 42) -> List[Dict[str, Any]]:
+    """Insert ``n`` synthetic products and return the generated rows"""
+    rows = generate_products(n, n_users=n_users, seed=seed)
+    db.bulk_insert_mappings(Product, rows)
+    db.commit()
+    return rows
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of recommender configurations: ranking quality against speed and memory
+
+Replays held-out user interactions. For every user with at least two
+interactions, the most recent one is held out and the rest become the
+user's profile (strongest first, as app/profiles.py keeps it); the
+personalized recommendations for that profile are then checked for the
+held-out product. Reported per configuration:
+
+  hit@k      share of users whose held-out product is in their top k
+  ndcg@k     the same, discounted by the rank it was found at
+  coverage   share of the catalogue recommended to at least one user
+  p50/p99    latency of one personalized recommendation call, in ms
+  model_mb   size of the serving structures (similarity, neighbours, embeddings, shards)
+  fit_s      build time
+
+Interactions come from the products table (--source database, using
+DATABASE_URL) or from synthetic data in which each user favours a couple of
+product lines (--source synthetic).
+
+Usage: python benchmarks/evaluate.py [--source synthetic] [--products 5000] [--users 300]
+       [--k 10] [--strategies dense,topk,svd,sharded] [--vectorizers tfidf,hashing]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.models import Product
+from app.profiles import interaction_seed, PROFILE_INTERACTIONS
+from app.recommender import ConstructionProductRecommender
+from app.synthetic import generate_products, SYNTHETIC_INTERACTIONS
+
+def synthetic_rows(n_products: int, n_users: int, seed: int = 42):
+    """Synthetic catalogue whose interactions follow per-user tastes, so there is signal to find"""
+    rows = generate_products(n_products, seed=seed)
+    rng = random.Random(seed)
+    product_lines = defaultdict(list)
+    for row in rows:
+        # The product name without its size, e.g. "PVC pipe"
+        product_lines[row['name'].rsplit(' ', 2)[0]].append(row)
+    lines = sorted(product_lines)
+
+    for row in rows:
+        row['user_id'] = None
+    # Each user interacts mostly within two favourite product lines
+    for user in range(n_users):
+        favourites = rng.sample(lines, 2)
+        for _ in range(rng.randint(3, 8)):
+            line = rng.choice(favourites) if rng.random() < 0.8 else rng.choice(lines)
+            row = rng.choice(product_lines[line])
+            if row['user_id'] is None:
+                row['user_id'] = f"user-{user}"
+                row['interaction_type'], row['interaction_weight'] = rng.choice(SYNTHETIC_INTERACTIONS)
+    return [Product(**row) for row in rows]
+
+def database_rows():
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return db.query(Product).all()
+    finally:
+        db.close()
+
+def held_out_interactions(rows):
+    """(profile seeds, held-out product id) for every user with at least two interactions"""
+    by_user = defaultdict(list)
+    for row in rows:
+        if row.user_id:
+            by_user[row.user_id].append(row)
+
+    cases = []
+    for user_id in sorted(by_user):
+        interactions = sorted(by_user[user_id], key=lambda row: (row.created_at or datetime.min, row.id))
+        if len(interactions) < 2:
+            continue
+        held_out, history = interactions[-1], interactions[:-1]
+        seeds = [interaction_seed(row) for row in history]
+        seeds.sort(key=lambda seed: (seed["interaction_weight"] or 0.0, seed["created_at"] or datetime.min), reverse=True)
+        cases.append((seeds[:PROFILE_INTERACTIONS], held_out.id))
+    return cases
+
+def model_bytes(model: ConstructionProductRecommender) -> int:
+    """Memory held by the strategy-specific serving structures"""
+    snapshot = model.snapshot
+    total = 0
+    if snapshot.similarity_matrix is not None:
+        total += snapshot.similarity_matrix.nbytes
+    if snapshot.neighbor_index is not None:
+        total += sum(array.nbytes for array in snapshot.neighbor_index)
+    if snapshot.embeddings is not None:
+        total += snapshot.embeddings.nbytes
+    if snapshot.shard_index is not None:
+        total += snapshot.shard_index.memory_bytes()
+    return total
+
+def evaluate(model: ConstructionProductRecommender, cases, k: int):
+    hits, gains, latencies = [], [], []
+    recommended = set()
+    for seeds, held_out in cases:
+        start = time.perf_counter()
+        recommendations, _ = model.get_personalized_recommendations(seeds, top_n=k)
+        latencies.append(time.perf_counter() - start)
+
+        ids = [rec['id'] for rec in recommendations]
+        recommended.update(ids)
+        rank = ids.index(held_out) if held_out in ids else None
+        hits.append(rank is not None)
+        # One relevant item, so the ideal DCG is 1
+        gains.append(1 / np.log2(rank + 2) if rank is not None else 0.0)
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "hit": float(np.mean(hits)),
+        "ndcg": float(np.mean(gains)),
+        "coverage": len(recommended) / len(model.snapshot.product_ids),
+        "p50": float(np.percentile(latencies_ms, 50)),
+        "p99": float(np.percentile(latencies_ms, 99)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--source", choices=["synthetic", "database"], default="synthetic")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--strategies", default="dense,topk,svd,sharded")
+    parser.add_argument("--vectorizers", default="tfidf")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.products, args.users) if args.source == "synthetic" else database_rows()
+    cases = held_out_interactions(rows)
+    if not cases:
+        sys.exit("No user has at least two interactions to evaluate against")
+    products_df = ConstructionProductRecommender.products_to_frame(rows)
+    # The model must not know who made the held-out interactions
+    held_out_rows = products_df['id'].isin([held_out for _, held_out in cases])
+    products_df.loc[held_out_rows, 'user_id'] = None
+    print(f"source={args.source} products={len(rows)} users={len(cases)} k={args.k}")
+
+    print(f"{'strategy':>10}{'vectorizer':>12}{'hit@k':>8}{'ndcg@k':>8}{'coverage':>10}"
+          f"{'p50_ms':>8}{'p99_ms':>8}{'model_mb':>10}{'fit_s':>8}")
+    for vectorizer in args.vectorizers.split(","):
+        for strategy in args.strategies.split(","):
+            model = ConstructionProductRecommender(strategy=strategy, vectorizer=vectorizer, workers=args.workers)
+            start = time.perf_counter()
+            model.fit_frame(products_df)
+            fit_seconds = time.perf_counter() - start
+            model.status = "ready"
+
+            result = evaluate(model, cases, args.k)
+            print(f"{strategy:>10}{vectorizer:>12}{result['hit']:>8.3f}{result['ndcg']:>8.3f}{result['coverage']:>10.3f}"
+                  f"{result['p50']:>8.2f}{result['p99']:>8.2f}{model_bytes(model) / 2 ** 20:>10.1f}{fit_seconds:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Load-test the API under sustained concurrency across server configurations
+
+Seeds a SQLite database with synthetic products, then for every
+configuration starts the app with uvicorn on a fresh copy of it and runs
+each scenario against it. A scenario (benchmarks/scenarios/*.json) is a
+weighted mix of requests issued by ``concurrency`` closed-loop clients for
+``duration`` seconds; the first ``warmup`` seconds are not measured. Paths
+and JSON bodies may use {product_id}, {user_id}, {category}, {query},
+{page} and {n} (a counter unique per request).
+
+A configuration is WORKERSxTHREADS: uvicorn worker processes x the
+threadpool that sync endpoints and blocking database calls run on
+(RECOMMENDER_THREADPOOL_SIZE). --env adds settings to every server, e.g.
+--env RECOMMENDER_STRATEGY=topk.
+
+Reports throughput, p50/p95/p99 latency, requests shed by admission control
+(429/503) and errors (any other 4xx/5xx, and connection failures).
+
+Usage: python benchmarks/loadtest.py [--configs 1x40,2x40,1x8] [--scenarios browse,write_burst,personalized]
+       [--products 5000] [--users 200] [--duration 30] [--concurrency 32] [--env KEY=VALUE ...]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIO_DIR = os.path.join(ROOT, "benchmarks", "scenarios")
+sys.path.insert(0, ROOT)
+
+import httpx
+import numpy as np
+
+QUERIES = ["pipe", "cement", "steel rebar", "drill", "roof tile", "copper wire", "plywood", "safety gloves"]
+
+def seed(path: str, n_products: int, n_users: int):
+    """Create the template database and return the values used to fill request templates"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    from app.database import Base, SessionLocal, engine
+    from app.models import ProductImage
+    from app.synthetic import seed_database
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        rows = seed_database(db, n_products, n_users=n_users)
+        for i, row in enumerate(rows[::10]):
+            db.add(ProductImage(product_id=row["id"], url=f"https://images.example.com/{i}.jpg", alt=row["name"], is_default=1))
+        db.commit()
+    finally:
+        db.close()
+    engine.dispose()
+
+    return {
+        "product_id": [row["id"] for row in rows],
+        "user_id": sorted({row["user_id"] for row in rows if row["user_id"]}),
+        "category": sorted({row["category"] for row in rows}),
+        "query": QUERIES,
+        "page": [str(page) for page in range(1, max(2, n_products // 20))],
+    }
+
+def load_scenario(name: str, duration: float = None, concurrency: int = None):
+    path = name if name.endswith(".json") else os.path.join(SCENARIO_DIR, f"{name}.json")
+    with open(path) as f:
+        scenario = json.load(f)
+    if duration:
+        scenario["duration"] = duration
+    if concurrency:
+        scenario["concurrency"] = concurrency
+    return scenario
+
+def fill(template, values, rng: random.Random, n: int):
+    """Substitute placeholders in a path or JSON body"""
+    if isinstance(template, dict):
+        return {key: fill(value, values, rng, n) for key, value in template.items()}
+    if not isinstance(template, str):
+        return template
+    return template.format(n=n, **{key: rng.choice(options) for key, options in values.items()})
+
+async def client_loop(client, scenario, values, rng, started, results, counter):
+    requests = scenario["requests"]
+    weights = [request["weight"] for request in requests]
+    measure_from = started + scenario["warmup"]
+    stop_at = measure_from + scenario["duration"]
+    while time.monotonic() < stop_at:
+        request = rng.choices(requests, weights)[0]
+        counter[0] += 1
+        path = fill(request["path"], values, rng, counter[0])
+        body = fill(request.get("json"), values, rng, counter[0])
+        sent = time.monotonic()
+        try:
+            response = await client.request(request["method"], path, json=body)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = None
+        finished = time.monotonic()
+        if sent >= measure_from:
+            results.append((finished - sent, status))
+
+async def run_scenario(base_url: str, scenario, values, seed: int = 0):
+    limits = httpx.Limits(max_connections=scenario["concurrency"], max_keepalive_connections=scenario["concurrency"])
+    results = []
+    counter = [0]
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        started = time.monotonic()
+        await asyncio.gather(*[
+            client_loop(client, scenario, values, random.Random(seed + i), started, results, counter)
+            for i in range(scenario["concurrency"])
+        ])
+    return results
+
+def summarize(results, duration: float):
+    latencies = np.array([latency for latency, _ in results]) * 1000
+    statuses = Counter(status for _, status in results)
+    shed = statuses[429] + statuses[503]
+    errors = sum(count for status, count in statuses.items() if status is None or (status >= 400 and status not in (429, 503)))
+    return {
+        "requests": len(results),
+        "rps": len(results) / duration,
+        "p50": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        "p95": float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+        "p99": float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+        "shed": shed,
+        "errors": errors,
+    }
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(database: str, workers: int, threads: int, extra_env, log):
+    port = free_port()
+    env = dict(os.environ)
+    env.update(extra_env)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{database}",
+        "RECOMMENDER_THREADPOOL_SIZE": str(threads),
+    })
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    return process, f"http://127.0.0.1:{port}"
+
+def wait_ready(base_url: str, workers: int, process, timeout: float = 600):
+    """Wait until every worker process (told apart by the pid in /ready) has reported ready"""
+    deadline = time.monotonic() + timeout
+    ready_pids = set()
+    while len(ready_pids) < workers:
+        if process.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"only {len(ready_pids)} of {workers} workers became ready")
+        try:
+            # A new connection per probe, so the kernel spreads them over the workers
+            response = httpx.get(f"{base_url}/ready", timeout=5)
+            if response.status_code == 200:
+                ready_pids.add(response.json()["pid"])
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", default="1x40,2x40,1x8")
+    parser.add_argument("--scenarios", default="browse,write_burst,personalized")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--duration", type=float, help="Override each scenario's measured seconds")
+    parser.add_argument("--concurrency", type=int, help="Override each scenario's concurrent clients")
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE added to every server's environment")
+    args = parser.parse_args()
+
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    scenarios = [load_scenario(name, args.duration, args.concurrency) for name in args.scenarios.split(",")]
+    configs = [tuple(int(part) for part in config.split("x")) for config in args.configs.split(",")]
+
+    workdir = tempfile.mkdtemp(prefix="recommender-loadtest-")
+    try:
+        template = os.path.join(workdir, "template.db")
+        values = seed(template, args.products, args.users)
+        print(f"products={args.products} users={len(values['user_id'])} cpus={os.cpu_count()} "
+              f"env={' '.join(args.env) or '-'}")
+        print(f"{'config':>8}{'scenario':>14}{'clients':>8}{'requests':>10}{'rps':>9}"
+              f"{'p50_ms':>9}{'p95_ms':>9}{'p99_ms':>9}{'shed':>7}{'errors':>8}")
+
+        for workers, threads in configs:
+            for scenario in scenarios:
+                # A fresh database per run, so earlier write scenarios do not skew later ones
+                database = os.path.join(workdir, f"w{workers}t{threads}-{scenario['name']}.db")
+                shutil.copy(template, database)
+                log_path = os.path.join(workdir, "server.log")
+                with open(log_path, "wb") as log:
+                    process, base_url = start_server(database, workers, threads, extra_env, log)
+                    try:
+                        wait_ready(base_url, workers, process)
+                        results = asyncio.run(run_scenario(base_url, scenario, values))
+                    except RuntimeError:
+                        with open(log_path, errors="replace") as f:
+                            sys.stderr.write(f.read()[-4000:])
+                        raise
+                    finally:
+                        process.terminate()
+                        process.wait(timeout=30)
+                summary = summarize(results, scenario["duration"])
+                print(f"{f'{workers}x{threads}':>8}{scenario['name']:>14}{scenario['concurrency']:>8}{summary['requests']:>10}"
+                      f"{summary['rps']:>9.1f}{summary['p50']:>9.1f}{summary['p95']:>9.1f}{summary['p99']:>9.1f}"
+                      f"{summary['shed']:>7}{summary['errors']:>8}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Benchmark block-wise top-K neighbour computation across worker counts
+
+Usage: python benchmarks/parallel_similarity.py [--products 50000] [--neighbors 50]
+       [--block-size 1024] [--workers 1,2,4,8]
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from app.recommender import ConstructionProductRecommender
+from app.similarity import top_k_neighbors
+from app.synthetic import generate_products
+
+def main():
+    cpu_count = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, 8, cpu_count} & set(range(1, cpu_count + 1)))
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--neighbors", type=int, default=50)
+    parser.add_argument("--block-size", type=int, default=1024)
+    parser.add_argument("--workers", default=",".join(map(str, default_workers)))
+    args = parser.parse_args()
+
+    recommender = ConstructionProductRecommender()
+    products_df = pd.DataFrame(generate_products(args.products))
+    _, tfidf_matrix = recommender.vectorize(products_df)
+    print(f"products={args.products} nnz={tfidf_matrix.nnz} neighbors={args.neighbors} "
+          f"block_size={args.block_size} cpus={cpu_count}")
+
+    baseline = None
+    reference = None
+    print(f"{'workers':>8}{'seconds':>10}{'speedup':>10}{'efficiency':>12}")
+    for workers in [int(w) for w in args.workers.split(",")]:
+        start = time.perf_counter()
+        indices, scores = top_k_neighbors(
+            tfidf_matrix, k=args.neighbors, block_size=args.block_size, workers=workers
+        )
+        elapsed = time.perf_counter() - start
+
+        # Every worker count must produce the same neighbour scores
+        if reference is None:
+            reference = scores
+        assert np.allclose(reference, scores)
+
+        baseline = baseline or elapsed
+        speedup = baseline / elapsed
+        print(f"{workers:>8}{elapsed:>10.2f}{speedup:>10.2f}{speedup / workers:>12.0%}")
+
+if __name__ == "__main__":
+    main()
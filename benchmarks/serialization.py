@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark the generic and pre-encoded serialization paths for /recommend
+
+Usage: python benchmarks/serialization.py [--products 2000] [--top-n 50] [--requests 500]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.database import SessionLocal, engine
+from app.main import RecommendationResponse, encoded_recommendation_response
+from app.models import Base
+from app.recommender import ConstructionProductRecommender
+from app.synthetic import seed_database
+
+def generic_path(recommender, product_id, top_n):
+    """What FastAPI does for a pydantic return value"""
+    response = RecommendationResponse(
+        data={
+            "product_id": product_id,
+            "recommendations": recommender.get_recommendations(product_id, top_n)
+        }
+    )
+    return JSONResponse(content=jsonable_encoder(response)).body
+
+def fast_path(recommender, product_id, top_n):
+    """Pre-encoded fragments plus orjson"""
+    return encoded_recommendation_response(
+        product_id, recommender.get_recommendations_json(product_id, top_n)
+    ).body
+
+def time_path(path, recommender, product_ids, top_n):
+    start = time.perf_counter()
+    for product_id in product_ids:
+        path(recommender, product_id, top_n)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--top-n", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        rows = seed_database(db, args.products)
+        recommender = ConstructionProductRecommender()
+        recommender.fit(db)
+    finally:
+        db.close()
+
+    product_ids = [rows[i % len(rows)]['id'] for i in range(args.requests)]
+
+    # Both paths must produce the same document
+    for product_id in product_ids[:20]:
+        assert json.loads(generic_path(recommender, product_id, args.top_n)) == \
+            json.loads(fast_path(recommender, product_id, args.top_n))
+
+    generic = time_path(generic_path, recommender, product_ids, args.top_n)
+    fast = time_path(fast_path, recommender, product_ids, args.top_n)
+
+    print(f"products={args.products} top_n={args.top_n} requests={args.requests}")
+    print(f"{'path':<10}{'total s':>10}{'per req ms':>14}")
+    print(f"{'generic':<10}{generic:>10.3f}{generic / args.requests * 1000:>14.3f}")
+    print(f"{'fast':<10}{fast:>10.3f}{fast / args.requests * 1000:>14.3f}")
+    print(f"speedup: {generic / fast:.1f}x")
+
+if __name__ == "__main__":
+    main()
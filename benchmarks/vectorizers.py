@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Compare the vocabulary (tfidf) and hashing vectorizers on ranking quality and speed
+
+Quality is measured against the vocabulary mode: overlap@k of each query's
+top-k neighbours, and category precision@k (share of neighbours in the query
+product's category). Fold-in compares the recommendations of products added
+with apply_changes against a full refit that includes them.
+
+Usage: python benchmarks/vectorizers.py [--products 20000] [--queries 500] [--k 10]
+       [--fold-in 200] [--workers 1]
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.models import Product
+from app.recommender import ConstructionProductRecommender, VECTORIZER_VOCABULARY, VECTORIZER_HASHING
+from app.synthetic import generate_products
+
+def top_k(tfidf_matrix, rows: np.ndarray, k: int) -> np.ndarray:
+    scores = (tfidf_matrix[rows] @ tfidf_matrix.T).toarray()
+    scores[np.arange(len(rows)), rows] = -np.inf
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1)
+
+def overlap(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean([len(set(x) & set(y)) / len(x) for x, y in zip(a.tolist(), b.tolist())]))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--fold-in", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    rows = [Product(**row) for row in generate_products(args.products + args.fold_in)]
+    base_rows, new_rows = rows[:args.products], rows[args.products:]
+    products_df = ConstructionProductRecommender.products_to_frame(base_rows)
+    all_df = ConstructionProductRecommender.products_to_frame(rows)
+    categories = products_df['category'].to_numpy()
+    queries = np.random.default_rng(0).choice(args.products, size=min(args.queries, args.products), replace=False)
+    print(f"products={args.products} queries={len(queries)} k={args.k} fold_in={args.fold_in}")
+
+    reference = None
+    print(f"{'vectorizer':>12}{'fit_s':>8}{'nnz':>10}{'overlap@k':>11}{'cat_p@k':>9}{'fold_in_s':>11}{'fold_in_overlap@k':>19}")
+    for mode in [VECTORIZER_VOCABULARY, VECTORIZER_HASHING]:
+        model = ConstructionProductRecommender(strategy="topk", vectorizer=mode, workers=args.workers)
+        start = time.perf_counter()
+        _, tfidf_matrix = model.vectorize(products_df)
+        fit_seconds = time.perf_counter() - start
+
+        neighbours = top_k(tfidf_matrix, queries, args.k)
+        if reference is None:
+            reference = neighbours
+        category_precision = float(np.mean(categories[neighbours] == categories[queries, None]))
+
+        # Fold new products into a fitted model, then compare with a refit that includes them
+        model.fit_frame(products_df)
+        model.status = "ready"
+        start = time.perf_counter()
+        model.apply_changes(new_rows)
+        fold_in_seconds = time.perf_counter() - start
+        new_positions = np.arange(args.products, args.products + args.fold_in)
+        folded = top_k(model.snapshot.tfidf_matrix, new_positions, args.k)
+        _, refit_matrix = model.vectorize(all_df)
+        refit = top_k(refit_matrix, new_positions, args.k)
+
+        print(f"{mode:>12}{fit_seconds:>8.2f}{tfidf_matrix.nnz:>10}{overlap(reference, neighbours):>11.3f}"
+              f"{category_precision:>9.3f}{fold_in_seconds:>11.2f}{overlap(refit, folded):>19.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Apply pending database migrations online, in throttled and resumable batches
+
+Replaces the one-shot migrate_*.py / add_columns.py scripts; see
+app/migrations.py for the migration list. Safe to re-run at any time.
+
+Usage: python migrate.py [--status] [--target VERSION] [--batch-size 1000] [--pause 0.05]
+"""
+import argparse
+import logging
+import sys
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from app.database import engine
+from app.migrations import MigrationRunner, MIGRATION_BATCH_SIZE, MIGRATION_BATCH_PAUSE
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="Show migration progress and exit")
+    parser.add_argument("--target", help="Stop after this migration version")
+    parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE, help="Max rows per backfill batch")
+    parser.add_argument("--pause", type=float, default=MIGRATION_BATCH_PAUSE, help="Seconds to sleep between batches")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    runner = MigrationRunner(engine, batch_size=args.batch_size, pause=args.pause)
+
+    if not args.status:
+        try:
+            applied = runner.run(target=args.target)
+        except Exception as e:
+            # Progress is checkpointed; re-running resumes from the failed step
+            print(f"❌ Migration failed: {e}")
+            sys.exit(1)
+        print(f"✅ Applied {len(applied)} migration(s)" + (f": {', '.join(applied)}" if applied else ""))
+
+    for state in runner.status():
+        print(f"{state['version']}  {state['status']:<12}{state['step']:>6}  {state['rows_backfilled']:>8} rows  {state['description']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import time
+
+# Configure the app before it is imported: a throwaway SQLite database,
+# query headers on, and no background polling of the database
+_database = tempfile.NamedTemporaryFile(prefix="recommender-test-", suffix=".db", delete=False)
+os.environ["DATABASE_URL"] = f"sqlite:///{_database.name}"
+os.environ["SQL_DEBUG_HEADERS"] = "1"
+os.environ["RECOMMENDER_SYNC_INTERVAL"] = "0"
+os.environ.pop("RECOMMENDER_MODEL_PATH", None)
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database import Base, SessionLocal, engine
+from app.main import app
+from app.models import ProductImage
+from app.recommender import recommender
+from app.synthetic import seed_database
+
+@pytest.fixture(scope="session")
+def catalog():
+    """Seed synthetic products, with images for the first few"""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        rows = seed_database(db, 200, n_users=10)
+        for i, row in enumerate(rows[:20]):
+            db.add(ProductImage(
+                product_id=row["id"],
+                url=f"https://images.example.com/{i}.jpg",
+                alt=row["name"],
+                is_default=1
+            ))
+        db.commit()
+    finally:
+        db.close()
+    yield rows
+    engine.dispose()
+    os.unlink(_database.name)
+
+@pytest.fixture(scope="session")
+def client(catalog):
+    """App client whose recommender has finished warming up"""
+    with TestClient(app) as client:
+        deadline = time.monotonic() + 60
+        while not recommender.is_ready:
+            assert time.monotonic() < deadline, "recommender did not warm up"
+            time.sleep(0.05)
+        yield client
@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app.migrations import MIGRATIONS, MigrationRunner
+from app.models import SchemaMigration
+
+ROWS = 25
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    engine.dispose()
+
+def migration_state(engine, version):
+    table = SchemaMigration.__table__
+    with engine.connect() as connection:
+        return connection.execute(table.select().where(table.c.version == version)).first()
+
+def test_fresh_database_then_no_op_rerun(engine):
+    runner = MigrationRunner(engine, pause=0)
+    assert runner.run() == [migration.version for migration in MIGRATIONS]
+
+    tables = set(inspect(engine).get_table_names())
+    assert {"products", "product_images", "recommender_model_versions", "product_neighbors", "schema_migrations"} <= tables
+    with engine.connect() as connection:
+        # SQLAlchemy does not reflect expression indexes on SQLite
+        indexes = set(connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+    assert {"ix_products_category_normalized", "idx_products_interaction_weight"} <= indexes
+    # Covered by the model's own index on the same column
+    assert "idx_products_user_id" not in indexes
+    assert all(state["status"] == "done" for state in runner.status())
+
+    assert MigrationRunner(engine, pause=0).run() == []
+
+def test_interrupted_backfill_resumes_from_checkpoint(engine, monkeypatch):
+    MigrationRunner(engine, pause=0).run(target="0001")
+    with engine.begin() as connection:
+        for i in range(ROWS):
+            connection.execute(
+                text("INSERT INTO products (id, name, created_at, updated_at) VALUES (:id, :name, NULL, NULL)"),
+                {"id": f"p{i:03d}", "name": f"Product {i}"}
+            )
+
+    # Fail inside the third batch's transaction, as if the process were killed
+    checkpoint = MigrationRunner.checkpoint
+    calls = []
+
+    def interrupted(self, connection, migration, key, rows=0):
+        calls.append(key)
+        if len(calls) == 3:
+            raise RuntimeError("interrupted")
+        checkpoint(self, connection, migration, key, rows)
+
+    monkeypatch.setattr(MigrationRunner, "checkpoint", interrupted)
+    with pytest.raises(RuntimeError):
+        MigrationRunner(engine, batch_size=5, pause=0).run()
+    monkeypatch.undo()
+
+    # Two batches committed; the third was rolled back with its checkpoint
+    state = migration_state(engine, "0002")
+    assert state.finished_at is None
+    assert state.step == 4
+    assert state.checkpoint == "p009"
+    assert state.rows_backfilled == 10
+    with engine.connect() as connection:
+        filled = connection.execute(text("SELECT id FROM products WHERE created_at IS NOT NULL ORDER BY id")).scalars().all()
+    assert filled == [f"p{i:03d}" for i in range(10)]
+
+    assert MigrationRunner(engine, batch_size=5, pause=0).run() == ["0002", "0003", "0004", "0005"]
+    state = migration_state(engine, "0002")
+    assert state.finished_at is not None
+    assert state.checkpoint is None
+    assert state.rows_backfilled == ROWS
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM products WHERE created_at IS NULL OR updated_at IS NULL")).scalar() == 0
+
+    assert MigrationRunner(engine, pause=0).run() == []
@@ -0,0 +1,39 @@
+from app.models import Product
+from app.pipeline import CoOccurrenceIndex
+from app.recommender import ConstructionProductRecommender
+from app.synthetic import generate_products
+
+def fitted_model():
+    rows = generate_products(300, seed=7)
+    for i, row in enumerate(rows[:120]):
+        row['user_id'] = f"user-{i % 12}"
+    model = ConstructionProductRecommender(strategy="dense")
+    model.fit_frame(ConstructionProductRecommender.products_to_frame([Product(**row) for row in rows]))
+    model.status = "ready"
+    return model, rows
+
+def seeds_of(model, rows, user_id):
+    return [
+        {"id": row["id"], "interaction_weight": 1.0, "interaction_type": "view"}
+        for row in rows if row["user_id"] == user_id
+    ]
+
+def test_cooccurrence_index_is_built_with_the_model():
+    model, rows = fitted_model()
+    assert model.snapshot.cooccurrence_index.version == model.version
+
+    _, metadata = model.get_personalized_recommendations(seeds_of(model, rows, "user-0"), top_n=5)
+    assert "cooccurrence" in metadata["candidates"]
+    assert "cooccurrence" not in metadata["skipped"]
+
+    model.apply_changes([Product(**{**rows[200], 'user_id': "user-0"})])
+    assert model.snapshot.cooccurrence_index.version == model.version
+
+def test_stale_cooccurrence_index_is_skipped():
+    model, rows = fitted_model()
+    model.snapshot.cooccurrence_index = CoOccurrenceIndex.build(model.snapshot.products_df, "older-version")
+
+    recommendations, metadata = model.get_personalized_recommendations(seeds_of(model, rows, "user-0"), top_n=5)
+    assert "cooccurrence" in metadata["skipped"]
+    assert "cooccurrence" not in metadata["candidates"]
+    assert len(recommendations) == 5
@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+from app.profiles import UserProfileCache
+
+def interaction(product_id, user_id, weight):
+    return SimpleNamespace(id=product_id, user_id=user_id, interaction_weight=weight, interaction_type="view", created_at=None)
+
+def seeds(*products):
+    return [{"id": p.id, "interaction_weight": p.interaction_weight, "interaction_type": p.interaction_type, "created_at": None} for p in products]
+
+def test_writes_update_only_their_user():
+    cache = UserProfileCache(max_size=10)
+    cache.put("alice", seeds(interaction("a1", "alice", 1.0)), cache.token())
+    cache.put("bob", seeds(interaction("b1", "bob", 1.0)), cache.token())
+
+    cache.add_interactions([interaction("a2", "alice", 5.0)])
+    assert [seed["id"] for seed in cache.get("alice")] == ["a2", "a1"]
+    assert [seed["id"] for seed in cache.get("bob")] == ["b1"]
+
+    cache.invalidate("alice")
+    assert cache.get("alice") is None
+    assert cache.get("bob") is not None
+
+def test_read_racing_a_write_is_not_cached():
+    cache = UserProfileCache(max_size=10)
+    token = cache.token()
+    # The write lands while the profile is being read from the database
+    cache.add_interaction(interaction("a2", "alice", 5.0))
+    cache.put("alice", seeds(interaction("a1", "alice", 1.0)), token)
+    assert cache.get("alice") is None
+
+    cache.put("alice", seeds(interaction("a2", "alice", 5.0), interaction("a1", "alice", 1.0)), cache.token())
+    assert cache.get("alice") is not None
+
+def test_profiles_expire():
+    cache = UserProfileCache(max_size=10, ttl=0)
+    cache.put("alice", seeds(interaction("a1", "alice", 1.0)), cache.token())
+    assert cache.get("alice") is None
@@ -0,0 +1,84 @@
+"""
+Per-endpoint SQL query budgets.
+
+Each request's statements are counted by the engine instrumentation in
+app/database.py and reported in the X-DB-Queries header. A test fails when
+an endpoint issues more statements than its budget, which catches N+1 loops
+and existence checks creeping back into hot paths. Lower a budget whenever
+an endpoint gets cheaper; raise one only with a reason.
+"""
+import pytest
+
+def queries(response) -> int:
+    return int(response.headers["X-DB-Queries"])
+
+@pytest.fixture(scope="module")
+def ids(catalog):
+    product = catalog[0]
+    user_id = next(row["user_id"] for row in catalog if row["user_id"])
+    return {"product_id": product["id"], "user_id": user_id}
+
+# (method, path, budget): paths are formatted with the ids fixture
+QUERY_BUDGETS = [
+    ("GET", "/health", 0),
+    ("GET", "/ready", 0),
+    ("GET", "/api/v1/metrics", 0),
+    ("GET", "/api/v1/model/status", 0),
+    # Known products are answered from the model alone
+    ("GET", "/api/v1/recommend/{product_id}", 0),
+    ("GET", "/api/v1/recommend/{product_id}?category=tools&in_stock=true", 0),
+    # Unknown ids need one existence check
+    ("GET", "/api/v1/recommend/no-such-product", 1),
+    ("GET", "/api/v1/products/search?q=pipe", 0),
+    # Count, page, and every image of the page at once
+    ("GET", "/api/v1/products?limit=10", 3),
+    ("GET", "/api/v1/products?limit=10&category=tools", 3),
+    ("GET", "/api/v1/users/{user_id}/products", 1),
+    # Profile query, then popular products and the newest-products fallback
+    ("GET", "/api/v1/users/no-such-user/recommendations", 2),
+]
+
+@pytest.mark.parametrize("method,path,budget", QUERY_BUDGETS)
+def test_query_budget(client, ids, method, path, budget):
+    response = client.request(method, path.format(**ids))
+    assert response.status_code < 500
+    assert queries(response) <= budget, f"{method} {path}: {queries(response)} queries, budget {budget}"
+
+def test_product_listing_queries_do_not_grow_with_page_size(client):
+    small = client.get("/api/v1/products?limit=2")
+    large = client.get("/api/v1/products?limit=50")
+    assert queries(small) == queries(large)
+    assert sum(len(product["images"]) for product in large.json()["data"]) > 0
+
+def test_personalized_recommendations_use_cached_profile(client, ids):
+    path = "/api/v1/users/{user_id}/recommendations".format(**ids)
+    first = client.get(path)
+    assert first.json()["data"]["type"] == "personalized"
+    assert queries(first) <= 1
+    # The profile is now cached for this model version
+    assert queries(client.get(path)) == 0
+
+def test_writes(client, ids):
+    created = client.post("/api/v1/products", json={
+        "product_id": "budget-test",
+        "name": "PVC pipe 3 ft",
+        "description": "Test product",
+        "price": 12.5,
+        "stock": 3,
+        "category": "plumbing",
+        "user_id": ids["user_id"],
+        "interaction_type": "view"
+    })
+    assert created.status_code == 200
+    # INSERT, then the refresh
+    assert queries(created) <= 2
+
+    deleted = client.delete(f"/api/v1/products/{created.json()['id']}")
+    assert deleted.status_code == 200
+    # Lookup, image delete, product delete
+    assert queries(deleted) <= 3
+
+def test_rows_and_time_are_reported(client):
+    response = client.get("/api/v1/products?limit=5")
+    assert int(response.headers["X-DB-Rows"]) >= 5
+    assert float(response.headers["X-DB-Time-Ms"]) >= 0
@@ -0,0 +1,82 @@
+import numpy as np
+import orjson
+import pytest
+
+from app.models import Product
+from app.planner import peak_rss_bytes
+from app.recommender import ConstructionProductRecommender
+from app.synthetic import generate_products
+
+def test_null_price_and_stock_do_not_break_the_fit():
+    rows = generate_products(50, seed=3)
+    rows[0]['stock'] = None
+    rows[1]['price'] = None
+    model = ConstructionProductRecommender(strategy="dense")
+    model.fit_frame(ConstructionProductRecommender.products_to_frame([Product(**row) for row in rows]))
+    model.status = "ready"
+
+    record = orjson.loads(model.snapshot.response_fragments[0] + b'0.5}')
+    assert record["stock"] is None
+    record = orjson.loads(model.snapshot.response_fragments[1] + b'0.5}')
+    assert record["price"] is None
+
+    recommendations = model.get_recommendations(rows[2]['id'], top_n=50)
+    by_id = {recommendation['id']: recommendation for recommendation in recommendations}
+    assert by_id[rows[0]['id']]['stock'] is None
+    # In-stock and price filters leave the NULLs out
+    assert rows[0]['id'] not in {r['id'] for r in model.get_recommendations(rows[2]['id'], top_n=50, in_stock=True)}
+    assert rows[1]['id'] not in {r['id'] for r in model.get_recommendations(rows[2]['id'], top_n=50, min_price=0)}
+
+def test_readers_keep_a_consistent_snapshot_across_updates():
+    rows = generate_products(60, seed=5)
+    model = ConstructionProductRecommender(strategy="dense")
+    model.fit_frame(ConstructionProductRecommender.products_to_frame([Product(**row) for row in rows[:40]]))
+    model.status = "ready"
+
+    snapshot = model.snapshot
+    mask = snapshot._filter_mask(in_stock=True)
+    assert model.apply_changes([Product(**row) for row in rows[40:]])
+    assert model.snapshot is not snapshot
+    assert len(model.snapshot.product_ids) == 60
+
+    # The old snapshot's mask, matrix and fragments still line up with each other
+    assert len(snapshot.product_ids) == 40
+    assert len(mask) == 40
+    result = snapshot.get_recommendations_json(rows[0]['id'], top_n=39, in_stock=True)
+    assert all(record['id'] in snapshot.product_positions for record in orjson.loads(result))
+
+def test_image_changes_keep_the_model_version():
+    rows = generate_products(30, seed=9)
+    model = ConstructionProductRecommender(strategy="dense")
+    model.fit_frame(ConstructionProductRecommender.products_to_frame([Product(**row) for row in rows]))
+    model.status = "ready"
+    before = model.snapshot
+
+    product_id = rows[3]['id']
+    assert model.apply_image_changes({product_id: ("https://images.example.com/3.jpg", "front")}, [product_id]) == 1
+
+    after = model.snapshot
+    assert after is not before
+    assert after.version == before.version
+    assert after.cooccurrence_index is before.cooccurrence_index
+    assert after.filter_arrays is before.filter_arrays
+    record = orjson.loads(after.response_fragments[3] + b'0}')
+    assert record["image"] == {"url": "https://images.example.com/3.jpg", "alt": "front"}
+    # The published snapshot before the change is untouched
+    assert orjson.loads(before.response_fragments[3] + b'0}')["image"] is None
+    assert before.products_df['image_url'].iat[3] is None
+
+def test_build_plan_reports_the_peak_of_its_own_build():
+    # An earlier, larger allocation raises the process-lifetime peak
+    scratch = np.ones(256 * 1024 * 1024 // 8)
+    del scratch
+    process_peak = peak_rss_bytes()
+
+    rows = generate_products(50, seed=7)
+    model = ConstructionProductRecommender(strategy="dense")
+    model.fit_frame(ConstructionProductRecommender.products_to_frame([Product(**row) for row in rows]))
+    plan = model.build_plan
+    if plan["peak_rss_scope"] != "build":
+        pytest.skip("no /proc/self/clear_refs")
+    assert plan["peak_rss_bytes"] < process_peak - 128 * 1024 * 1024
+    assert plan["rss_growth_bytes"] is not None
@@ -0,0 +1,41 @@
+import threading
+import time
+
+from app.refit import RefitScheduler
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_failed_rebuild_is_retried_without_new_writes():
+    calls = []
+    rebuilt = threading.Event()
+
+    def rebuild():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        rebuilt.set()
+
+    scheduler = RefitScheduler(rebuild, debounce=0, max_staleness=0, retry_backoff=0.2)
+    scheduler.start()
+    try:
+        scheduler.mark_dirty(3)
+        wait_for(lambda: len(calls) == 1)
+        wait_for(lambda: scheduler.stats()["consecutive_failures"] == 1)
+        stats = scheduler.stats()
+        assert stats["pending_changes"] == 3
+        assert stats["last_error"] == "database is locked"
+
+        assert rebuilt.wait(5)
+        assert len(calls) == 2
+        assert calls[1] - calls[0] >= 0.2
+        wait_for(lambda: not scheduler.stats()["rebuilding"])
+        stats = scheduler.stats()
+        assert stats["pending_changes"] == 0
+        assert stats["consecutive_failures"] == 0
+        assert stats["last_error"] is None
+    finally:
+        scheduler.stop()
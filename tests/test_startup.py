@@ -0,0 +1,43 @@
+from app import main
+
+def test_warm_up_retries_until_the_model_fits(client, monkeypatch):
+    fit = main.recommender.fit
+    attempts = []
+
+    def flaky_fit(db):
+        attempts.append(db)
+        if len(attempts) == 1:
+            raise RuntimeError("database is not reachable")
+        return fit(db)
+
+    started = []
+    monkeypatch.setattr(main, "WARM_UP_RETRY_BACKOFF", 0.01)
+    monkeypatch.setattr(main.recommender, "fit", flaky_fit)
+    monkeypatch.setattr(main.model_sync, "start", lambda: started.append(True))
+
+    main.warm_up_model()
+
+    assert len(attempts) == 2
+    assert started == [True]
+    assert main.recommender.is_ready
+
+def test_warm_up_fits_when_the_saved_model_cannot_be_loaded(client, monkeypatch):
+    fit = main.recommender.fit
+    fitted = []
+
+    def broken_load(path):
+        raise ValueError("incompatible model artifact")
+
+    def counting_fit(db):
+        fitted.append(db)
+        return fit(db)
+
+    monkeypatch.setattr(main, "MODEL_PATH", None)
+    monkeypatch.setattr(main.recommender, "load", broken_load)
+    monkeypatch.setattr(main.recommender, "fit", counting_fit)
+    monkeypatch.setattr(main.model_sync, "start", lambda: None)
+
+    main.warm_up_model()
+
+    assert len(fitted) == 1
+    assert main.recommender.is_ready
@@ -0,0 +1,56 @@
+import threading
+from datetime import timedelta
+
+from app.database import SessionLocal
+from app.models import Product
+from app.recommender import ConstructionProductRecommender
+from app.sync import ChangeDataSync
+from app.synthetic import generate_products
+
+class CountingSync(ChangeDataSync):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.polled = threading.Event()
+
+    def poll_once(self):
+        self.polled.set()
+        return 1
+
+def test_request_polls_before_the_interval():
+    sync = CountingSync(ConstructionProductRecommender(), interval=60)
+    assert not sync.request()
+
+    sync.start()
+    try:
+        assert not sync.polled.wait(0.2)
+        assert sync.request()
+        assert sync.polled.wait(5)
+    finally:
+        sync.stop()
+    assert not sync.request()
+
+def test_rows_committed_behind_the_watermark_are_applied_once(catalog):
+    model = ConstructionProductRecommender(strategy="dense")
+    db = SessionLocal()
+    try:
+        model.fit(db)
+        model.status = "ready"
+        sync = ChangeDataSync(model, interval=0, lag=60)
+        # Right after a fit, the rows in the lag window are applied once more
+        sync.poll_once()
+        assert sync.poll_once() == 0
+
+        # Committed after the watermark had already moved past its updated_at
+        late = generate_products(1, seed=11)[0]
+        late["id"] = "late-commit"
+        late["updated_at"] = model.watermark[0] - timedelta(seconds=1)
+        db.add(Product(**late))
+        db.commit()
+
+        assert sync.poll_once() == 1
+        assert model.snapshot.has_product("late-commit")
+        assert sync.poll_once() == 0
+    finally:
+        db.query(Product).filter(Product.id == "late-commit").delete()
+        db.commit()
+        db.close()